@@ -0,0 +1,53 @@
+import numpy as np
+import threading
+import os
+
+# Columns stored for every city and day of the year of the anomaly summary
+SUMMARY_COLUMNS = ['count', 'mean_score', 'min_score', 'anomaly_rate']
+
+# Anomaly scores of the historical observations summarized per city and day of the year, built by backfill_anomalies.py
+class AnomalySummary:
+    def __init__(self, file_path):
+        data = np.load(file_path, allow_pickle=False)
+        self.cities = {str(city): i for i, city in enumerate(data['cities'])}
+        self.values = data['values']                # Shape: (cities, 366, columns), with day 1 of the year at index 0
+        self.model_version = str(data['model_version'])
+
+    # Typical anomaly score and share of anomalies of a city on each of a list of dates, or None for an unknown city
+    def context(self, city_code, dates):
+        city = self.cities.get(city_code)
+        if city is None:
+            return None
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        days = (dates - dates.astype('datetime64[Y]')).astype(int)
+        values = self.values[city, days].astype(object)
+
+        # Days of the year without any observation have no statistics, and are sent as null
+        values[values != values] = None
+        return {
+            'MeanAnomalyScore': values[:, SUMMARY_COLUMNS.index('mean_score')],
+            'AnomalyRate': values[:, SUMMARY_COLUMNS.index('anomaly_rate')]
+        }
+
+summary_path = os.environ.get('ANOMALY_SUMMARY_PATH', 'models/anomaly_summary.npz')
+summary_state = {'mtime': None, 'summary': None}
+summary_lock = threading.Lock()
+
+# Modification time of the anomaly summary file, or None if it has not been built
+def summary_mtime():
+    try:
+        return os.path.getmtime(summary_path)
+    except FileNotFoundError:
+        return None
+
+# Get the anomaly summary, reloading it when the file changes, or None if it has not been built
+def get_anomaly_summary():
+    mtime = summary_mtime()
+    if mtime is None:
+        return None
+
+    with summary_lock:
+        if summary_state['mtime'] != mtime:
+            summary_state['summary'] = AnomalySummary(summary_path)
+            summary_state['mtime'] = mtime
+        return summary_state['summary']
@@ -1,16 +1,81 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+from typing import Literal
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from multi_regression import load_regression_model, regression_date_predict
-from isolation_forest import train_isolation_forest, detect_anomaly
-from randomforest_classifier import load_classification_model, classify_weather
-from minmax_regression import load_minmax_model, minmax_predict
-import os
+from multi_regression import train_regression_model, load_regression_model
+from isolation_forest import train_isolation_forest, load_isolation_model, detect_anomalies
+from randomforest_classifier import train_classification_model, load_classification_model
+from minmax_regression import train_minmax_model, load_minmax_model, minmax_predict_batch
+from scenario_sweep import SweepGrid, evaluate_sweep, sweep_payload
+from training_orchestrator import TrainingOrchestrator, ModelNotReadyError
+from inference_executor import inference_executor, InferenceQueueFullError
+from weather_store import get_store
+from artifacts import list_artifacts
+from forecast_pipeline import forecast_classifications, forecast_cache, get_model_version, publish_model_version
+from response_cache import response_cache, etag_matches
+from anomaly_summary import get_anomaly_summary, summary_mtime
+from features import get_feature_set
+from model_registry import registry
+from metrics import metrics, city_label, MetricsMiddleware
 import pandas as pd
+import asyncio
+import json
+import os
+
+CITY_CODES = ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']
+
+# Models trained and loaded at startup, with the slowest one first so it starts training straight away
+training_jobs = {
+    'multi_regression': {
+        'artifacts': ['models/multi_regression_model.joblib'],
+        'train': train_regression_model,
+        'load': load_regression_model
+    }
+}
+for city_code in CITY_CODES:
+    training_jobs[f'isolation_{city_code}'] = {
+        'artifacts': [f'models/{city_code}_isolation_forest_model.joblib', f'models/{city_code}_scaler.joblib'],
+        'train': train_isolation_forest,
+        'load': load_isolation_model,       # Keeps the model and scaler resident in the model registry
+        'args': (city_code,)
+    }
+training_jobs['classification'] = {
+    'artifacts': ['models/classification_model.joblib', 'models/label_encoder.joblib', 'models/accuracy.joblib'],
+    'train': train_classification_model,
+    'load': load_classification_model
+}
+training_jobs['minmax'] = {
+    'artifacts': ['models/minmax_model.joblib'],
+    'train': train_minmax_model,
+    'load': load_minmax_model
+}
+# Updated model artifacts (such as from incremental_training.py) are picked up every MODEL_RELOAD_INTERVAL seconds,
+# which is also when the version of the models that the caches are keyed on is worked out again
+# The training features are built once before the models that need training are trained in parallel
+# Trained models are loaded on their first use, and also in the background at startup unless MODEL_WARMUP is set to 0
+orchestrator = TrainingOrchestrator(
+    training_jobs,
+    reload_interval=float(os.environ.get('MODEL_RELOAD_INTERVAL', 30)),
+    prepare=get_feature_set,
+    warmup=os.environ.get('MODEL_WARMUP', '1') != '0',
+    on_change=publish_model_version
+)
+
+# Start training and loading the models in the background once the server starts, so it can accept requests straight away
+# The weather dataset is also loaded into memory in the background with warmup, rather than when this module is imported
+@asynccontextmanager
+async def lifespan(app):
+    orchestrator.start()
+    if orchestrator.warmup:
+        asyncio.get_running_loop().run_in_executor(None, get_store, 'dataset/combined_weather_data.csv')
+    yield
 
 # Creating the FastAPI App
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Define allowed origins
 origins = [
@@ -24,70 +89,105 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],             # Allows all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],             # Allows all headers
+    expose_headers=["ETag"],         # Lets the front-end read the ETag of cached responses
 )
 
-# Function to train isolation forest model for each city
-def train_isolation():
-    for city_code in ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']:
-        model_path = f'models/{city_code}_isolation_forest_model.joblib'
-        scaler_path = f'models/{city_code}_scaler.joblib'
-        if not os.path.exists(model_path) or not os.path.exists(scaler_path):       # Check if training has been done before
-            train_isolation_forest(city_code)
-            print(f"Completed {city_code} Isolation Model Training")
-        else:
-            print(f"{city_code} Isolation Model and Scaler already trained.")
-
-# Helper function to get the season
-def get_season(date_str):
-    date = datetime.strptime(date_str, '%Y-%m-%d')
-    month = date.month
-    day = date.day
-    if (month == 12 and day >= 1) or (month in [1, 2]):
-        return 'Summer'
-    elif (month == 3 and day >= 1) or (month in [4, 5]):
-        return 'Autumn'
-    elif (month == 6 and day >= 1) or (month in [7, 8]):
-        return 'Winter'
-    elif (month == 9 and day >= 1) or (month in [10, 11]):
-        return 'Spring'
-
-# Helper function to read and filter data from CSV
+# Record the duration and status of every request for the /metrics endpoint
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+# Statistics already kept by the model registry, the forecast cache, the inference executor and the training orchestrator, only read when /metrics is scraped
+def collect_component_stats():
+    registry_stats = registry.stats()
+    yield 'weather_model_registry_hits_total', 'counter', "Model artifacts served from memory by the model registry", {}, registry_stats['hits']
+    yield 'weather_model_registry_misses_total', 'counter', "Model artifacts loaded from disk by the model registry", {}, registry_stats['misses']
+    yield 'weather_model_registry_loaded', 'gauge', "Model artifacts held in memory by the model registry", {}, registry_stats['loaded']
+
+    cache_stats = forecast_cache.stats()
+    yield 'weather_forecast_cache_hits_total', 'counter', "Classification forecasts served from the forecast cache", {}, cache_stats['hits']
+    yield 'weather_forecast_cache_misses_total', 'counter', "Classification forecasts not found in the forecast cache", {}, cache_stats['misses']
+    yield 'weather_forecast_cache_size', 'gauge', "Classification forecasts held in the forecast cache", {}, cache_stats['size']
+
+    executor_stats = inference_executor.stats()
+    yield 'weather_inference_in_flight', 'gauge', "Inference calls running or waiting for a worker", {}, executor_stats['in_flight']
+    yield 'weather_inference_rejected_total', 'counter', "Inference calls rejected because the queue was full", {}, executor_stats['rejected']
+
+    response_stats = response_cache.stats()
+    yield 'weather_response_cache_size', 'gauge', "Responses held in the in-process response cache", {}, response_stats['size']
+
+    for name, status in orchestrator.readiness()['models'].items():
+        yield 'weather_model_ready', 'gauge', "Whether each model has finished training and loading", {'model': name}, int(status == 'ready')
+
+metrics.register_collector(collect_component_stats)
+
+# Helper function to get a trained model, answering with 503 while it is still training
+def get_model(name):
+    try:
+        return orchestrator.get(name)
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+# Helper function to run CPU-bound work in the inference executor so it does not block the event loop, answering with 503 when its queue is full
+async def run_inference(func, *args):
+    try:
+        return await inference_executor.run(func, *args)
+    except InferenceQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+# Helper function to answer with 404 when the weather dataset has no observations of a city, instead of failing later in the models
+def check_city(store, city_code):
+    if not store.has_city(city_code):
+        raise HTTPException(status_code=404, detail=f"Unknown city code {city_code}")
+
+# Helper function to read and filter data from the in-memory weather store
 def get_filtered_data(file_path, target_date_str, city_code_str):
+    store = get_store(file_path)
+    check_city(store, city_code_str)
     try:
          # Convert target_date_str to datetime
         target_date = datetime.strptime(target_date_str, "%Y-%m-%d")
 
-        # Load CSV file
-        df = pd.read_csv(file_path, parse_dates=['Date'])  # Assuming 'date' column exists
-
         # Calculate date range: 4 days before and after the target date
         start_date = target_date - timedelta(days=4)
         end_date = target_date + timedelta(days=4)
 
-        # Filter the dataframe
-        filtered_df = df[(df['Date'] >= start_date) & (df['Date'] <= end_date) & (df['CityCode'] == city_code_str)]
+        # Slice the city's rows for the date range out of the store
+        filtered_df = store.get_window(city_code_str, start_date, end_date)
 
+        # Add the typical anomaly score of each day of the year from backfill_anomalies.py, if it was built with the current models
+        summary = get_anomaly_summary()
+        if summary is not None and summary.model_version == get_model_version() and len(filtered_df):
+            context = summary.context(city_code_str, filtered_df['Date'].to_numpy())
+            if context is not None:
+                filtered_df = filtered_df.assign(**context)
 
-        # Convert filtered data to JSON
-        return filtered_df.to_dict(orient='records')
+        # Convert filtered data to JSON, sending the missing observations as null since JSON has no NaN
+        return filtered_df.astype(object).where(filtered_df.notna(), None).to_dict(orient='records')
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing data: {e}")
-
-# Load models at startup
-print("Training multi-regression model")
-multiregression_model = load_regression_model()
-print("Multi-regression model training complete")
-
-print("Training isolation forest models")
-train_isolation()
-
-print("Training classification model")
-clf, label_encoder, accuracy = load_classification_model()
-print("Classification model training completed")
-
-print("Training Minimum and Maximum Temperature regression model")
-minmax_model = load_minmax_model()
-print("Minimum and Maximum Temperature regression model training completed")
+        raise HTTPException(status_code=500, detail=f"Error processing data: {e}")
+
+# Version of everything the forecast responses depend on, which are the trained models, the weather dataset and the anomaly summary
+def response_version():
+    return [get_model_version(), os.stat('dataset/combined_weather_data.csv').st_mtime_ns, summary_mtime()]
+
+# Helper function to answer a deterministic request from the response cache, only computing the response when it has not been cached yet
+# Clients sending the ETag of a response they already have in an If-None-Match header get a 304 status without a body
+async def cached_response(request, endpoint, payload, city, compute):
+    etag = response_cache.etag(endpoint, payload, response_version())
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        metrics.inc('weather_response_cache_total', endpoint=endpoint, result='not_modified')
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(etag)
+    if body is None:
+        metrics.inc('weather_response_cache_total', endpoint=endpoint, result='miss')
+        content = await compute()
+        with metrics.timer('serialization', city=city):
+            body = JSONResponse(content=jsonable_encoder(content)).body
+        response_cache.put(etag, body)
+    else:
+        metrics.inc('weather_response_cache_total', endpoint=endpoint, result='hit')
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # Request models
 class MinMaxRequest(BaseModel):
@@ -114,47 +214,99 @@ class ClassificationRequest(BaseModel):
     city_code: str
     date: str
 
+# Inclusive range of values of a sweep variable, such as humidity from 40 to 100 by steps of 5
+class SweepRange(BaseModel):
+    start: float
+    stop: float
+    step: float
+
+class SweepRequest(BaseModel):
+    city_code: str
+    dates: list[str]
+    rainfall: float | list[float] | SweepRange
+    humidity: float | list[float] | SweepRange
+    pressure: float | list[float] | SweepRange
+    wind_gust_speed: float | list[float] | SweepRange
+    uv_index: float | list[float] | SweepRange
+    anomalies: bool = True
+    encoding: Literal['list', 'base64'] = 'list'
+
+class BulkForecastRequest(BaseModel):
+    city_codes: list[str] = CITY_CODES
+    start_date: str
+    end_date: str
+
+# API Endpoint to check whether the models have finished training, answering with 503 until all of them are ready
+@app.get("/ready")
+async def ready():
+    readiness = orchestrator.readiness()
+    return JSONResponse(status_code=200 if readiness['ready'] else 503, content=readiness)
+
+# API Endpoint exposing the request and pipeline stage latencies, cache statistics and counters in the Prometheus text format
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# API Endpoint to list the size, version hash and load time of every saved model artifact
+@app.get("/artifacts")
+async def artifacts():
+    return {"status": "success", "data": list_artifacts()}
+
 # API Endpoint to Predict Min and Max Temperature using the MultiOutput Regression Model
 @app.post("/predict_minmax")
-async def predict_minmax(req: MinMaxRequest):
+async def predict_minmax(req: MinMaxRequest, request: Request):
+    minmax_model = get_model('minmax')
     try:
         # Setting the input date as well as the dates for the date range
         target_date = datetime.strptime(req.date, '%Y-%m-%d')
         dates_range = [target_date + timedelta(days=i) for i in range(-5, 6)]
-        predictions = {}
+        days_str = [day.strftime('%Y-%m-%d') for day in dates_range]
+        city = city_label(req.city_code)
 
-        training_data = get_filtered_data('dataset/combined_weather_data.csv', req.date, req.city_code)
+        async def compute():
+            training_data = await run_inference(metrics.timed(get_filtered_data, 'training_data', city=city), 'dataset/combined_weather_data.csv', req.date, req.city_code)
 
-        # Loop through each date in the range specified to get regression output for each date
-        for day in dates_range:
-            day_str = day.strftime('%Y-%m-%d')
+            # Using the MinMax Regression Model to get the regression output for every date in the range at once
+            batch_predictions = await run_inference(metrics.timed(minmax_predict_batch, 'minmax_regression', city=city), days_str, req.city_code, req.rainfall, req.humidity, req.pressure, req.wind_gust_speed, req.uv_index, minmax_model)
+            predictions = dict(zip(days_str, batch_predictions))
 
-            # Using the MinMax Regression Model
-            prediction = minmax_predict(day_str, req.city_code, req.rainfall, req.humidity, req.pressure, req.wind_gust_speed, req.uv_index, minmax_model)
-            predictions[day_str] = prediction
+            return {"status": "success", "data": predictions, "training_data": training_data}
 
-        return {"status": "success", "data": predictions, "training_data": training_data}
+        # The response only depends on the request, the models and the dataset, so repeated requests are served from the response cache
+        payload = {**req.model_dump(), 'date': target_date.strftime('%Y-%m-%d')}
+        return await cached_response(request, '/predict_minmax', payload, city, compute)
+    except HTTPException:
+        raise
     except Exception as e:
+        metrics.inc('weather_request_errors_total', endpoint='/predict_minmax', error=type(e).__name__)
         raise HTTPException(status_code=500, detail=str(e))
 
 # API Endpoint to Predict Anomalies using the Isolation Forest Model
 @app.post("/predict_anomaly")
-async def predict_anomaly(req: AnomalyRequest):
+async def predict_anomaly(req: AnomalyRequest, request: Request):
+    minmax_model = get_model('minmax')
+    if req.city_code in CITY_CODES:
+        get_model(f'isolation_{req.city_code}')
     try:
         # Setting the input date as well as the dates for the date range
         target_date = datetime.strptime(req.date, '%Y-%m-%d')
         dates_range = [target_date + timedelta(days=i) for i in range(-5, 6)]
-        anomalies = {}
-        predictions = {}
-        final_result = {}
-        # Get training data from dataset
-        training_data = get_filtered_data("dataset/combined_weather_data.csv", req.date, req.city_code)
-
-        # Loop through each date in the range specified to get anomaly output for each date
-        for day in dates_range:
-            day_str = day.strftime('%Y-%m-%d')
-            weather_data = {
-                'Date': day_str,
+        city = city_label(req.city_code)
+
+        async def compute():
+            anomalies = {}
+            predictions = {}
+            final_result = {}
+            # Get training data from dataset
+            training_data = await run_inference(metrics.timed(get_filtered_data, 'training_data', city=city), "dataset/combined_weather_data.csv", req.date, req.city_code)
+
+            # Using the MinMax Regression Model to get the regression output for every date in the range at once
+            days_str = [day.strftime('%Y-%m-%d') for day in dates_range]
+            batch_predictions = await run_inference(metrics.timed(minmax_predict_batch, 'minmax_regression', city=city), days_str, req.city_code, req.rainfall, req.humidity, req.pressure, req.wind_gust_speed, req.uv_index, minmax_model)
+
+            # Using the anomaly prediction model to score the observation on every date in the range at once
+            weather_data = pd.DataFrame({
+                'Date': days_str,
                 'MinTemp': req.mintemp,
                 'MaxTemp': req.maxtemp,
                 'Rainfall': req.rainfall,
@@ -162,71 +314,133 @@ async def predict_anomaly(req: AnomalyRequest):
                 'Humidity': req.humidity,
                 'Pressure': req.pressure,
                 'UVIEF': req.uv_index
-            }
-
-            # Using the anomaly prediction model
-            anomaly = detect_anomaly(weather_data, req.city_code)
-
-            # Retrieving the anomaly result
-            anomalies[day_str] = {"anomaly": "Yes" if anomaly['anomaly_label'] < 0 else "No", "score": anomaly['anomaly_score']}
-
-            prediction = minmax_predict(day_str, req.city_code, req.rainfall, req.humidity, req.pressure, req.wind_gust_speed, req.uv_index, minmax_model)
-            predictions[day_str] = prediction
-            final_result[day_str] = {
-                "anomaly": "Yes" if anomaly['anomaly_label'] < 0 else "No",
-                "score": anomaly['anomaly_score'],
-                "MaxTemp": prediction['MaxTemp'],
-                "Date": prediction['Date']
-            }
+            })
+            batch_anomalies = await run_inference(metrics.timed(detect_anomalies, 'anomaly_detection', city=city), weather_data, req.city_code)
+
+            # Loop through each date in the range specified to get anomaly output for each date
+            for i, (day_str, prediction) in enumerate(zip(days_str, batch_predictions)):
+                anomaly = batch_anomalies.iloc[i]
+
+                # Retrieving the anomaly result
+                anomalies[day_str] = {"anomaly": "Yes" if anomaly['anomaly_label'] < 0 else "No", "score": anomaly['anomaly_score']}
+
+                predictions[day_str] = prediction
+                final_result[day_str] = {
+                    "anomaly": "Yes" if anomaly['anomaly_label'] < 0 else "No",
+                    "score": anomaly['anomaly_score'],
+                    "MaxTemp": prediction['MaxTemp'],
+                    "Date": prediction['Date']
+                }
         
-        return {"status": "success", "data": final_result, "minmax": predictions, "training_data": training_data}
+            return {"status": "success", "data": final_result, "minmax": predictions, "training_data": training_data}
+
+        # The response only depends on the request, the models and the dataset, so repeated requests are served from the response cache
+        payload = {**req.model_dump(), 'date': target_date.strftime('%Y-%m-%d')}
+        return await cached_response(request, '/predict_anomaly', payload, city, compute)
+    except HTTPException:
+        raise
     except Exception as e:
+        metrics.inc('weather_request_errors_total', endpoint='/predict_anomaly', error=type(e).__name__)
         raise HTTPException(status_code=500, detail=str(e))
 
 # API Endpoint to Classify Weather using the Random Forest Classification Model
 @app.post("/classification_predict")
-async def classification_predict(req: ClassificationRequest):
+async def classification_predict(req: ClassificationRequest, request: Request):
+    multiregression_model = get_model('multi_regression')
+    clf, label_encoder, accuracy = get_model('classification')
+    if req.city_code in CITY_CODES:
+        get_model(f'isolation_{req.city_code}')
     try:
         # Setting the input date as well as the dates for the date range
         target_date = datetime.strptime(req.date, '%Y-%m-%d')
         dates_range = [target_date + timedelta(days=i) for i in range(-5, 6)]
-        classifications = {}
-
-        # Loop through each date in the range specified to get classification output for each date
-        for day in dates_range:
-            day_str = day.strftime('%Y-%m-%d')
-
-            # Getting the variables data based on the date using the multi-output regression model
-            prediction = regression_date_predict(day_str, req.city_code, multiregression_model)
-
-            # Using the output of the regression model to determine if there is an anomaly
-            anomaly = detect_anomaly(prediction, req.city_code)
-
-            season = get_season(day_str)        # Getting the season of the date used for input
-
-            # Using the classification model predictor using the output of the regression model and the anomaly score
-            classification = classify_weather(
-                clf, label_encoder, accuracy,
-                min_temp=prediction['MinTemp'],
-                max_temp=prediction['MaxTemp'],
-                humidity=prediction['Humidity'],
-                windspeed=prediction['WindGustSpeed'],
-                uv=prediction['UVIEF'],
-                season=season,
-                anomaly_score=anomaly['anomaly_score']
-            )
-            classifications[day_str] = {
-                "day_forecast": classification['day_forecast'],
-                "day_reliability": classification['day_reliability'],
-                "night_forecast": classification['night_forecast'],
-                "night_reliability": classification['night_reliability'],
-                "min_temp": prediction['MinTemp'],
-                "max_temp": prediction['MaxTemp'],
-                "humidity": prediction['Humidity'],
-                "windspeed": prediction['WindGustSpeed'],
-                "uv": prediction['UVIEF'],
-            }
-
-        return {"status": "success", "data": classifications}
+        days_str = [day.strftime('%Y-%m-%d') for day in dates_range]
+
+        async def compute():
+            check_city(await run_inference(get_store, 'dataset/combined_weather_data.csv'), req.city_code)
+
+            # Running the regression, anomaly detection and classification pipeline, reusing any cached forecasts
+            classifications = await run_inference(forecast_classifications, days_str, req.city_code, multiregression_model, clf, label_encoder, accuracy)
+            return {"status": "success", "data": classifications}
+
+        # The response only depends on the city, the date and the models, so repeated requests are served from the response cache
+        payload = {'city_code': req.city_code, 'date': target_date.strftime('%Y-%m-%d')}
+        return await cached_response(request, '/classification_predict', payload, city_label(req.city_code), compute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        metrics.inc('weather_request_errors_total', endpoint='/classification_predict', error=type(e).__name__)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# API Endpoint to predict the min and max temperature, and optionally the anomaly score, of every combination of dates and weather inputs
+# Each weather input can be a single value, a list of values or a range, and the results come back as flat arrays over the grid of combinations
+@app.post("/sweep_minmax")
+async def sweep_minmax(req: SweepRequest):
+    if req.city_code not in CITY_CODES:
+        raise HTTPException(status_code=400, detail=f"Unknown city code {req.city_code}")
+    minmax_model = get_model('minmax')
+    if req.anomalies:
+        get_model(f'isolation_{req.city_code}')
+
+    try:
+        inputs = req.model_dump(include={'rainfall', 'humidity', 'pressure', 'wind_gust_speed', 'uv_index'})
+        grid = SweepGrid([datetime.strptime(day, '%Y-%m-%d').strftime('%Y-%m-%d') for day in req.dates], **inputs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    city = city_label(req.city_code)
+    try:
+        results = await run_inference(metrics.timed(evaluate_sweep, 'sweep', city=city), grid, req.city_code, minmax_model, req.anomalies)
+        with metrics.timer('serialization', city=city):
+            return JSONResponse(content={"status": "success", "data": sweep_payload(grid, results, req.encoding)})
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        metrics.inc('weather_request_errors_total', endpoint='/sweep_minmax', error=type(e).__name__)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Largest date range accepted by the bulk forecast endpoint, and the number of days computed per batch
+BULK_MAX_DAYS = 3660
+BULK_CHUNK_DAYS = 31
+
+# API Endpoint to forecast the weather classification of several cities over a date range, streamed as one JSON object per line (NDJSON)
+@app.post("/bulk_forecast")
+async def bulk_forecast(req: BulkForecastRequest):
+    multiregression_model = get_model('multi_regression')
+    clf, label_encoder, accuracy = get_model('classification')
+    for city_code in req.city_codes:
+        if city_code not in CITY_CODES:
+            raise HTTPException(status_code=400, detail=f"Unknown city code {city_code}")
+        get_model(f'isolation_{city_code}')
+
+    try:
+        start_date = datetime.strptime(req.start_date, '%Y-%m-%d')
+        end_date = datetime.strptime(req.end_date, '%Y-%m-%d')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    total_days = (end_date - start_date).days + 1
+    if total_days < 1 or total_days > BULK_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The date range must cover between 1 and {BULK_MAX_DAYS} days")
+
+    days_str = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(total_days)]
+
+    # Compute and send the forecasts one batch of dates at a time, with a small first batch so the first lines arrive quickly
+    async def generate():
+        chunk_start = 0
+        chunk_days = 1
+        while chunk_start < total_days:
+            chunk = days_str[chunk_start:chunk_start + chunk_days]
+            for city_code in req.city_codes:
+                try:
+                    classifications = await run_inference(forecast_classifications, chunk, city_code, multiregression_model, clf, label_encoder, accuracy)
+                except Exception as e:
+                    yield json.dumps({"status": "error", "city_code": city_code, "date": chunk[0], "detail": getattr(e, 'detail', str(e))}) + "\n"
+                    return
+                yield "".join(
+                    json.dumps({"city_code": city_code, "date": day_str, **classification}) + "\n"
+                    for day_str, classification in classifications.items()
+                )
+            chunk_start += len(chunk)
+            chunk_days = BULK_CHUNK_DAYS
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,98 @@
+from inference_engine import save_flat_arrays, load_flat_arrays
+import threading
+import hashlib
+import joblib
+import json
+import time
+import os
+
+# Memory-map the numpy arrays of loaded artifacts by default, set ARTIFACT_MMAP_MODE to an empty value to read them into memory instead
+# Sklearn copies the tree arrays of a forest when unpickling it, so the memory-mapped node arrays of its flat engine are what is actually shared
+MMAP_MODE = os.environ.get('ARTIFACT_MMAP_MODE', 'r') or None
+
+# Load times of the artifacts loaded by this process
+load_times = {}
+load_times_lock = threading.Lock()
+
+# Path of the metadata file kept next to an artifact
+def metadata_path(path):
+    return path + '.meta.json'
+
+# Hash of the artifact file contents, used as its version
+def file_version(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+# Save a model artifact uncompressed, so that its numpy arrays can be memory-mapped when loading
+# The file is written under a temporary name first and then swapped in, so readers never see a half-written artifact
+# The watermark records how much of the dataset the model was trained on, and the features its columns, for incremental training
+# The node arrays of forests are also saved next to the artifact for the flat-array engine
+def save_artifact(obj, path, watermark=None):
+    temp_path = path + '.tmp'
+    joblib.dump(obj, temp_path, compress=0)
+    os.replace(temp_path, path)
+
+    metadata = {
+        'size': os.path.getsize(path),
+        'version': file_version(path),
+        'saved_at': time.time(),
+        'watermark': watermark,
+        'features': list(obj.feature_names_in_) if hasattr(obj, 'feature_names_in_') else None
+    }
+    with open(metadata_path(path), 'w') as f:
+        json.dump(metadata, f)
+    save_flat_arrays(obj, path, metadata['version'])
+    return metadata
+
+# Watermark of the dataset rows used to train a model
+def dataset_watermark(df):
+    return {
+        'rows': len(df),
+        'last_date': str(df['Date'].max())[:10]
+    }
+
+# Metadata saved with an artifact, empty if the artifact or its metadata does not exist
+def read_metadata(path):
+    try:
+        with open(metadata_path(path)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+# Get the watermark saved with an artifact, or None if it was not recorded
+def read_watermark(path):
+    return read_metadata(path).get('watermark')
+
+# Load a model artifact, memory-mapping its arrays read-only and recording how long the load took
+# When memory-mapping, the flat-array engine of a forest is also built from the node arrays saved next to it
+def load_artifact(path, mmap_mode=MMAP_MODE):
+    start = time.perf_counter()
+    obj = joblib.load(path, mmap_mode=mmap_mode)
+    if mmap_mode is not None:
+        load_flat_arrays(obj, path, read_metadata(path).get('version'))
+    with load_times_lock:
+        load_times[path] = time.perf_counter() - start
+    return obj
+
+# Size, version and load time of an artifact
+def artifact_info(path):
+    try:
+        with open(metadata_path(path)) as f:
+            info = json.load(f)
+    except (FileNotFoundError, ValueError):
+        # Artifacts saved before the metadata was recorded
+        info = {'size': os.path.getsize(path), 'version': None, 'saved_at': os.path.getmtime(path)}
+
+    with load_times_lock:
+        info['load_time'] = load_times.get(path)
+    return info
+
+# Information on every artifact in the models folder
+def list_artifacts(models_dir='models'):
+    return {
+        name: artifact_info(os.path.join(models_dir, name))
+        for name in sorted(os.listdir(models_dir)) if name.endswith('.joblib')
+    }
@@ -0,0 +1,91 @@
+from isolation_forest import train_isolation_forest, load_isolation_model
+from inference_engine import score_samples
+from forecast_pipeline import get_model_version
+from anomaly_summary import SUMMARY_COLUMNS, summary_path
+from features import featurize_isolation, DATASET_PATH
+from dataset import read_dataset
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import numpy as np
+import argparse
+import os
+
+CITY_CODES = ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']
+
+# Score every observation of a city at once with the city's isolation forest
+# The observations are interpolated and median-filled the same way as when the model was trained
+def score_city(csv_path, city_code):
+    features = featurize_isolation(read_dataset(csv_path), city_code)
+    model, scaler = load_isolation_model(city_code)
+    scores = score_samples(model, scaler.transform(features)) - model.offset_
+    return city_code, features.index.to_numpy(), scores
+
+# Anomaly score statistics of each city for every day of the year
+def summarize(df, scores):
+    values = np.full((len(CITY_CODES), 366, len(SUMMARY_COLUMNS)), np.nan)
+    days = df['Date'].dt.dayofyear.to_numpy() - 1
+    cities = df['CityCode'].astype(object).to_numpy()
+
+    for city, city_code in enumerate(CITY_CODES):
+        rows = (cities == city_code) & ~np.isnan(scores)
+        counts = np.bincount(days[rows], minlength=366)
+        min_scores = np.full(366, np.inf)
+        np.minimum.at(min_scores, days[rows], scores[rows])
+
+        with np.errstate(invalid='ignore'):
+            values[city, :, 0] = counts
+            values[city, :, 1] = np.bincount(days[rows], weights=scores[rows], minlength=366) / counts
+            values[city, :, 2] = np.where(counts > 0, min_scores, np.nan)
+            values[city, :, 3] = np.bincount(days[rows], weights=scores[rows] < 0, minlength=366) / counts
+    return values
+
+# Score every row of the weather dataset with its city's isolation forest, scoring the cities in parallel processes
+# Saves a copy of the dataset with the score and label of each row, and the per-city, per-day-of-year summary used by the API
+def backfill_anomalies(csv_path=DATASET_PATH, output_path='dataset/combined_weather_anomalies.csv', summary_output=summary_path, workers=None):
+    # Training any missing isolation forest first, so the workers only ever load them
+    for city_code in CITY_CODES:
+        if not os.path.exists(f'models/{city_code}_isolation_forest_model.joblib') or not os.path.exists(f'models/{city_code}_scaler.joblib'):
+            train_isolation_forest(city_code)
+
+    # Converting the dataset once before the workers memory-map it
+    df = read_dataset(csv_path)
+    scores = np.full(len(df), np.nan)
+
+    workers = workers or min(len(CITY_CODES), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(score_city, csv_path, city_code) for city_code in CITY_CODES]
+        for future in as_completed(futures):
+            city_code, rows, city_scores = future.result()
+            scores[rows] = city_scores
+            print(f"Scored {len(rows)} {city_code} observations, {int((city_scores < 0).sum())} anomalies")
+
+    # Write to temporary files first so the API never reads a half-written summary
+    annotated = df.assign(AnomalyScore=scores, AnomalyLabel=np.where(np.isnan(scores), 0, np.where(scores < 0, -1, 1)))
+    temp_path = output_path + '.tmp'
+    annotated.to_csv(temp_path, index=False)
+    os.replace(temp_path, output_path)
+    print(f"Anomaly scores saved to {output_path}")
+
+    temp_path = summary_output + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(
+            f,
+            cities=np.asarray(CITY_CODES),
+            values=summarize(df, scores),
+            model_version=np.asarray(get_model_version())
+        )
+    os.replace(temp_path, summary_output)
+    print(f"Anomaly summary saved to {summary_output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every row of the weather dataset with its city's anomaly detection model")
+    parser.add_argument('--input', default=DATASET_PATH, help="Path of the weather dataset")
+    parser.add_argument('--output', default='dataset/combined_weather_anomalies.csv', help="Path of the dataset annotated with the anomaly scores")
+    parser.add_argument('--summary', default=summary_path, help="Path of the per-city, per-day-of-year anomaly summary")
+    parser.add_argument('--workers', type=int, help="Number of cities scored in parallel (one per core by default)")
+    args = parser.parse_args()
+
+    backfill_anomalies(args.input, args.output, args.summary, args.workers)
+
+if __name__ == '__main__':
+    main()
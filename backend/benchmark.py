@@ -0,0 +1,259 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import multiprocessing
+import numpy as np
+import tracemalloc
+import argparse
+import tempfile
+import resource
+import asyncio
+import httpx
+import time
+import json
+import sys
+import os
+
+CITY_CODES = ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']
+DATASET_PATH = 'dataset/combined_weather_data.csv'
+
+# Metrics where a higher value is better, every other metric is a time or a size where lower is better
+HIGHER_IS_BETTER = {'throughput_rps'}
+
+# Latency percentiles of a list of durations in seconds, reported in milliseconds
+def summarize(durations):
+    durations = np.asarray(durations) * 1000
+    return {
+        'count': len(durations),
+        'mean_ms': float(durations.mean()),
+        'p50_ms': float(np.percentile(durations, 50)),
+        'p95_ms': float(np.percentile(durations, 95)),
+        'p99_ms': float(np.percentile(durations, 99))
+    }
+
+# Request body of each endpoint, cycling through the cities and the days of the year so that the results are not all cache hits
+def endpoint_payload(endpoint, i):
+    city_code = CITY_CODES[i % len(CITY_CODES)]
+    date = (datetime(2016, 1, 1) + timedelta(days=i % 366)).strftime('%Y-%m-%d')
+    if endpoint == '/classification_predict':
+        return {'city_code': city_code, 'date': date}
+
+    payload = {'city_code': city_code, 'date': date, 'rainfall': 1.0, 'humidity': 60, 'pressure': 1015, 'wind_gust_speed': 30, 'uv_index': 3}
+    if endpoint == '/predict_anomaly':
+        payload.update(mintemp=10, maxtemp=25)
+    return payload
+
+# Send requests to an endpoint of the app in-process, with a fixed number of requests in flight at once
+async def benchmark_endpoint(app, endpoint, requests, concurrency):
+    latencies = []
+    errors = 0
+    next_request = iter(range(requests))
+
+    # Errors raised by the app are answered with a 500 status and counted, rather than stopping the benchmark
+    # Any answer outside the 2xx range counts as an error, and makes the benchmark fail once every section has run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        async def worker():
+            nonlocal errors
+            for i in next_request:
+                start = time.perf_counter()
+                response = await client.post(endpoint, json=endpoint_payload(endpoint, i))
+                latencies.append(time.perf_counter() - start)
+                if not 200 <= response.status_code < 300:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    result = summarize(latencies)
+    result['throughput_rps'] = requests / elapsed
+    result['errors'] = errors
+    return result
+
+def benchmark_endpoints(requests, concurrency):
+    import api
+
+    # The lifespan of the app is not run by the ASGI transport, so the models are trained and loaded here
+    api.orchestrator.start()
+    api.orchestrator.wait()
+
+    results = {}
+    for endpoint in ['/predict_minmax', '/predict_anomaly', '/classification_predict']:
+        print(f"Benchmarking {endpoint} with {requests} requests, {concurrency} at a time")
+        results[endpoint] = asyncio.run(benchmark_endpoint(api.app, endpoint, requests, concurrency))
+    return results
+
+# Call a function repeatedly after a warm-up call and summarize its durations
+def time_function(func, repeat):
+    func()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+def benchmark_functions(repeat):
+    from minmax_regression import minmax_predict
+    from multi_regression import regression_date_predict
+    from isolation_forest import detect_anomaly
+    from randomforest_classifier import classify_weather
+    from forecast_pipeline import get_season
+    import api
+
+    api.orchestrator.start()
+    api.orchestrator.wait()
+    minmax_model = api.orchestrator.get('minmax')
+    multiregression_model = api.orchestrator.get('multi_regression')
+    clf, label_encoder, accuracy = api.orchestrator.get('classification')
+
+    weather_data = {'Date': '2016-06-10', 'MinTemp': 10, 'MaxTemp': 25, 'Rainfall': 1.0, 'WindGustSpeed': 30, 'Humidity': 60, 'Pressure': 1015, 'UVIEF': 3}
+    functions = {
+        'minmax_predict': lambda: minmax_predict('2016-06-10', 'MEL', 1.0, 60, 1015, 30, 3, minmax_model),
+        'regression_date_predict': lambda: regression_date_predict('2016-06-10', 'MEL', multiregression_model),
+        'detect_anomaly': lambda: detect_anomaly(weather_data, 'MEL'),
+        'classify_weather': lambda: classify_weather(clf, label_encoder, accuracy, 10, 25, 60, 30, 3, get_season('2016-06-10'), 0.1),
+        'get_filtered_data': lambda: api.get_filtered_data(DATASET_PATH, '2016-06-10', 'MEL')
+    }
+
+    results = {}
+    for name, func in functions.items():
+        print(f"Benchmarking {name} over {repeat} calls")
+        results[name] = time_function(func, repeat)
+    return results
+
+# Run a training function in a scratch folder so the saved models are left untouched, measuring its time and peak memory
+# The settings chosen by tuning.py are still read from their file outside the scratch folder, so the models measured are the ones served
+# tracemalloc follows the Python and numpy allocations, while the maximum resident set size also covers the native ones
+def measure_training(name, dataset_dir, tuned_config_path):
+    import model_config
+    from multi_regression import train_regression_model
+    from minmax_regression import train_minmax_model
+    from isolation_forest import train_isolation_forest
+    from randomforest_classifier import train_classification_model
+
+    train_functions = {
+        'train_regression_model': train_regression_model,
+        'train_minmax_model': train_minmax_model,
+        'train_isolation_forest': lambda: train_isolation_forest('MEL'),
+        'train_classification_model': train_classification_model
+    }
+
+    model_config.TUNED_CONFIG_PATH = tuned_config_path
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        os.symlink(dataset_dir, os.path.join(scratch_dir, 'dataset'))
+        os.mkdir(os.path.join(scratch_dir, 'models'))
+        os.chdir(scratch_dir)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        train_functions[name]()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'seconds': seconds,
+        'peak_memory_mb': peak / 2**20,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10,
+        'tuned': os.path.exists(tuned_config_path)
+    }
+
+# Each training function runs in a fresh process, so the memory used by one does not count towards the next
+def benchmark_training(names):
+    from model_config import TUNED_CONFIG_PATH
+
+    dataset_dir = os.path.abspath('dataset')
+    tuned_config_path = os.path.abspath(TUNED_CONFIG_PATH)
+    results = {}
+    for name in names:
+        print(f"Benchmarking {name}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results[name] = pool.submit(measure_training, name, dataset_dir, tuned_config_path).result()
+    return results
+
+# Time taken to load each saved model artifact by this process
+def model_load_times():
+    from artifacts import list_artifacts
+    return {name: info['load_time'] for name, info in list_artifacts().items() if info['load_time'] is not None}
+
+# Compare the results with a baseline run, returning the metrics that got worse by more than the threshold
+def compare(results, baseline, threshold):
+    regressions = []
+    for section, entries in results.items():
+        if not isinstance(entries, dict) or section == 'meta':
+            continue
+        for name, metrics in entries.items():
+            base_metrics = baseline.get(section, {}).get(name)
+            if base_metrics is None:
+                continue
+            if not isinstance(metrics, dict):
+                metrics, base_metrics = {'seconds': metrics}, {'seconds': base_metrics}
+
+            for metric, value in metrics.items():
+                base_value = base_metrics.get(metric)
+                if metric in ('count', 'errors', 'tuned') or not base_value or value is None:
+                    continue
+                change = value / base_value - 1
+                worse = change < -threshold if metric in HIGHER_IS_BETTER else change > threshold
+                if worse:
+                    regressions.append({'section': section, 'name': name, 'metric': metric, 'baseline': base_value, 'value': value, 'change': change})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints, model functions and model training")
+    parser.add_argument('--sections', default='endpoints,functions', help="Comma-separated sections to run: endpoints, functions, training")
+    parser.add_argument('--requests', type=int, default=200, help="Number of requests sent to each endpoint")
+    parser.add_argument('--concurrency', type=int, default=8, help="Number of requests in flight at once")
+    parser.add_argument('--repeat', type=int, default=100, help="Number of calls to each model function")
+    parser.add_argument('--train', default='train_regression_model,train_minmax_model,train_isolation_forest,train_classification_model', help="Comma-separated training functions to run in the training section")
+    parser.add_argument('--output', default='benchmark_results.json', help="File to save the results to")
+    parser.add_argument('--baseline', help="Results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    sections = args.sections.split(',')
+    results = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'repeat': args.repeat
+        }
+    }
+    if 'endpoints' in sections:
+        results['endpoints'] = benchmark_endpoints(args.requests, args.concurrency)
+    if 'functions' in sections:
+        results['functions'] = benchmark_functions(args.repeat)
+    if 'endpoints' in sections or 'functions' in sections:
+        results['model_load'] = model_load_times()
+    if 'training' in sections:
+        results['training'] = benchmark_training(args.train.split(','))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Saved the benchmark results to {args.output}")
+
+    # Timings of requests that failed are meaningless, so any error status fails the run
+    failed = {endpoint: result['errors'] for endpoint, result in results.get('endpoints', {}).items() if result['errors']}
+    for endpoint, errors in failed.items():
+        print(f"{endpoint} answered {errors} of {args.requests} requests with an error status")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression in {regression['section']} {regression['name']} {regression['metric']}: {regression['baseline']:.3f} -> {regression['value']:.3f} ({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions of more than {args.threshold:.0%} against {args.baseline}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
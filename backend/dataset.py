@@ -0,0 +1,121 @@
+import pandas as pd
+import numpy as np
+import threading
+import hashlib
+import shutil
+import json
+import os
+
+# Folder holding the converted datasets, one subfolder per version of each CSV file
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', 'dataset/.cache')
+
+# Columns parsed as dates, every other text column is stored as a categorical column
+DATE_COLUMNS = ['Date']
+
+build_lock = threading.Lock()
+
+# Signature of a CSV file, changing whenever the file is modified
+def source_signature(csv_path, delimiter):
+    stat = os.stat(csv_path)
+    return hashlib.sha1(repr((stat.st_size, stat.st_mtime_ns, delimiter)).encode()).hexdigest()[:16]
+
+# Folder of the converted copy of a CSV file
+def cache_path(csv_path, signature):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(CACHE_DIR, f'{name}-{signature}')
+
+# Save each column of a frame as a typed numpy array, with text columns as category codes, along with a manifest describing them
+def write_columns(df, output_dir, metadata=None):
+    os.makedirs(output_dir, exist_ok=True)
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        column = {'name': name, 'file': f'{i}.npy'}
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            values = series.to_numpy()
+        else:
+            categorical = pd.Categorical(series)
+            values = categorical.codes
+            column['categories'] = categorical.categories.tolist()
+        np.save(os.path.join(output_dir, column['file']), values)
+        columns.append(column)
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump({**(metadata or {}), 'rows': len(df), 'columns': columns}, f)
+
+# Create a memory-mapped array for each column of a frame that is filled in later, along with the same manifest as write_columns
+# Nothing is held in memory, so frames larger than the available memory can be written a few rows at a time
+def allocate_columns(output_dir, names, rows, dtype=np.float32, metadata=None):
+    os.makedirs(output_dir, exist_ok=True)
+    columns = [{'name': name, 'file': f'{i}.npy'} for i, name in enumerate(names)]
+    arrays = {
+        column['name']: np.lib.format.open_memmap(os.path.join(output_dir, column['file']), mode='w+', dtype=dtype, shape=(rows,))
+        for column in columns
+    }
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump({**(metadata or {}), 'rows': rows, 'columns': columns}, f)
+    return arrays
+
+# Load a frame saved with write_columns or allocate_columns, memory-mapping the numeric and date columns rather than copying them
+def read_columns(output_dir):
+    with open(os.path.join(output_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    data = {}
+    for column in manifest['columns']:
+        values = np.load(os.path.join(output_dir, column['file']), mmap_mode='r')
+        if 'categories' in column:
+            values = pd.Categorical.from_codes(values, categories=column['categories'])
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+# Move a completely written temporary folder into place, so readers never see a partial one
+def publish(temp_dir, output_dir):
+    try:
+        os.rename(temp_dir, output_dir)
+    except OSError:
+        # Another process finished writing the same version first
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+# Remove the older versions of a cached folder, leaving the folders still being written by other processes
+def remove_stale_versions(name, current_dir):
+    for entry in os.scandir(CACHE_DIR):
+        if entry.is_dir() and entry.path != current_dir and '.tmp' not in entry.name and entry.name.rsplit('-', 1)[0] == name:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+# Parse a CSV file once and save its columns, with dates as datetime64 and text as categorical columns
+def convert_csv(csv_path, delimiter, output_dir):
+    header = pd.read_csv(csv_path, delimiter=delimiter, nrows=0).columns
+    df = pd.read_csv(csv_path, delimiter=delimiter, parse_dates=[column for column in DATE_COLUMNS if column in header])
+
+    temp_dir = f'{output_dir}.tmp{os.getpid()}'
+    write_columns(df, temp_dir, {'source': os.path.basename(csv_path)})
+    publish(temp_dir, output_dir)
+
+# Read a dataset CSV through its columnar cache, converting it first if the CSV is new or has changed
+# The numeric and date columns are memory-mapped rather than copied, so reading a converted dataset costs almost nothing
+def read_dataset(csv_path, delimiter=','):
+    signature = source_signature(csv_path, delimiter)
+    output_dir = cache_path(csv_path, signature)
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+
+    if not os.path.exists(manifest_path):
+        with build_lock:
+            if not os.path.exists(manifest_path):
+                print(f"Converting {csv_path} into the columnar dataset cache")
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                convert_csv(csv_path, delimiter, output_dir)
+                remove_stale_versions(os.path.splitext(os.path.basename(csv_path))[0], output_dir)
+
+    return read_columns(output_dir)
+
+# Convert every dataset ahead of time, such as when deploying
+def main():
+    read_dataset('dataset/combined_weather_data.csv')
+    read_dataset('dataset/train_weather_data.csv', delimiter=';')
+    read_dataset('dataset/test_weather_data.csv', delimiter=';')
+    print(f"Datasets converted into {CACHE_DIR}")
+
+if __name__ == '__main__':
+    main()
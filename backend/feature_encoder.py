@@ -0,0 +1,77 @@
+import numpy as np
+import threading
+import warnings
+import weakref
+
+# The encoded features are passed to the models as plain arrays, whose column order already matches the model's feature names
+# The filter is installed once on import, as changing the process-wide warning filters per request is not thread-safe
+warnings.filterwarnings('ignore', message='X does not have valid feature names', category=UserWarning)
+
+# Encodes date, weather and city inputs straight into a NumPy array in the column order of a trained model
+# The array is a buffer owned by the calling thread and overwritten by its next encode call, so copy it to keep it any longer
+class FeatureEncoder:
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.columns = {name: i for i, name in enumerate(self.feature_names)}
+
+        # Column of the one-hot encoded city codes
+        self.city_columns = {
+            name[len('CityCode_'):]: i for i, name in enumerate(self.feature_names) if name.startswith('CityCode_')
+        }
+        self.local = threading.local()
+
+    # Get a zeroed buffer of at least the given number of rows, reused between calls of the same thread
+    def get_buffer(self, rows):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None or buffer.shape[0] < rows:
+            buffer = np.empty((max(rows, 16), len(self.feature_names)))
+            self.local.buffer = buffer
+        buffer = buffer[:rows]
+        buffer.fill(0)
+        return buffer
+
+    # Encode the inputs of a list of dates, the city code and the other values can be a single value or one value per date
+    # The returned array is the thread's reused buffer, so it must be used (or copied) before encoding again in the same thread
+    def encode(self, dates, city_code, **values):
+        dates = np.asarray(dates, dtype='datetime64[D]').reshape(-1)
+        inputs = self.get_buffer(len(dates))
+
+        # Extracting date-related features from the dates
+        years = dates.astype('datetime64[Y]')
+        months = dates.astype('datetime64[M]')
+        date_features = {
+            'Year': years.astype(int) + 1970,
+            'Month': months.astype(int) % 12 + 1,
+            'Day': (dates - months).astype(int) + 1,
+            'DayOfYear': (dates - years).astype(int) + 1
+        }
+        for name, value in list(date_features.items()) + list(values.items()):
+            column = self.columns.get(name)
+            if column is not None:
+                inputs[:, column] = np.asarray(value, dtype=float)
+
+        # One-hot encode the city code of each row
+        if isinstance(city_code, str):
+            column = self.city_columns.get(city_code)
+            if column is not None:
+                inputs[:, column] = 1
+        else:
+            for row, city in enumerate(city_code):
+                column = self.city_columns.get(city)
+                if column is not None:
+                    inputs[row, column] = 1
+
+        return inputs
+
+# One encoder for each trained model, built on first use
+encoders = weakref.WeakKeyDictionary()
+encoders_lock = threading.Lock()
+
+# Get the feature encoder of a trained model
+def get_encoder(model):
+    with encoders_lock:
+        encoder = encoders.get(model)
+        if encoder is None:
+            encoder = FeatureEncoder(model.feature_names_in_)
+            encoders[model] = encoder
+        return encoder
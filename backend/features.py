@@ -0,0 +1,124 @@
+from dataset import read_dataset, write_columns, read_columns, publish, remove_stale_versions, source_signature, CACHE_DIR
+from artifacts import dataset_watermark
+import pandas as pd
+import threading
+import hashlib
+import json
+import os
+
+DATASET_PATH = 'dataset/combined_weather_data.csv'
+WEATHER_COLUMNS = ['MinTemp', 'MaxTemp', 'Rainfall', 'WindGustSpeed', 'Humidity', 'Pressure', 'UVIEF']
+
+# Datasets larger than this many bytes are featurized by streaming_features.py one chunk at a time instead of being loaded whole
+STREAMING_THRESHOLD_BYTES = int(os.environ.get('STREAMING_THRESHOLD_BYTES', 1 << 30))
+
+feature_sets = {}
+feature_sets_lock = threading.Lock()
+
+# Date features and one-hot encoded cities shared by the MultiOutput and MinMax Regression Models
+def featurize_regression(df):
+    df = df.dropna(subset=WEATHER_COLUMNS).copy()
+
+    # Extract date-related features
+    df['Year'] = df['Date'].dt.year
+    df['Month'] = df['Date'].dt.month
+    df['Day'] = df['Date'].dt.day
+    df['DayOfYear'] = df['Date'].dt.dayofyear
+
+    # Remove original Date column
+    df.drop('Date', axis=1, inplace=True)
+
+    # Convert CityCode to one-hot encoded columns
+    return pd.get_dummies(df, columns=['CityCode'])
+
+# Interpolated and median-filled observations of a city used by the Isolation Forest Model
+def featurize_isolation(df, city_code):
+    df = df[df['CityCode'] == city_code].copy()
+    df['DayOfYear'] = df['Date'].dt.dayofyear
+
+    # Interpolate numeric columns only
+    numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
+    df[numeric_columns] = df[numeric_columns].interpolate(method='linear')
+
+    # Add 'DayOfYear' to the list of numeric columns for scaling
+    numeric_columns = list(numeric_columns) + ['DayOfYear']
+
+    # Fill any remaining NaN values with median (for numeric columns only)
+    df[numeric_columns] = df[numeric_columns].fillna(df[numeric_columns].median())
+    return df[numeric_columns]
+
+# Features of every model trained on the weather dataset, along with the watermarks of the rows they were built from
+class FeatureSet:
+    def __init__(self, regression, isolation, watermark, city_watermarks):
+        self.regression = regression
+        self.isolation = isolation
+        self.watermark = watermark
+        self.city_watermarks = city_watermarks
+
+    @classmethod
+    def build(cls, df):
+        city_codes = sorted(df['CityCode'].dropna().unique())
+        return cls(
+            regression=featurize_regression(df),
+            isolation={city_code: featurize_isolation(df, city_code) for city_code in city_codes},
+            watermark=dataset_watermark(df),
+            city_watermarks={city_code: dataset_watermark(df[df['CityCode'] == city_code]) for city_code in city_codes}
+        )
+
+    # Save every feature frame into a folder, written under a temporary name and then moved into place
+    def save(self, output_dir):
+        temp_dir = f'{output_dir}.tmp{os.getpid()}'
+        write_columns(self.regression, os.path.join(temp_dir, 'regression'))
+        for city_code, frame in self.isolation.items():
+            write_columns(frame, os.path.join(temp_dir, f'isolation_{city_code}'))
+        with open(os.path.join(temp_dir, 'features.json'), 'w') as f:
+            json.dump({'watermark': self.watermark, 'city_watermarks': self.city_watermarks}, f)
+        publish(temp_dir, output_dir)
+
+    @classmethod
+    def load(cls, output_dir):
+        with open(os.path.join(output_dir, 'features.json')) as f:
+            metadata = json.load(f)
+        return cls(
+            regression=read_columns(os.path.join(output_dir, 'regression')),
+            isolation={city_code: read_columns(os.path.join(output_dir, f'isolation_{city_code}')) for city_code in metadata['city_watermarks']},
+            watermark=metadata['watermark'],
+            city_watermarks=metadata['city_watermarks']
+        )
+
+# Get the features of the weather dataset, building them once per version of the dataset and caching them on disk
+# The training processes each load the same cached features instead of parsing and featurizing the dataset again
+# Large datasets (or any dataset when streaming is set) are read in chunks into float32 columns, subsampled to a bounded number of rows
+def get_feature_set(csv_path=DATASET_PATH, streaming=None):
+    if streaming is None:
+        streaming = os.path.getsize(csv_path) > STREAMING_THRESHOLD_BYTES
+    # Keyed on the size and modification time of the dataset like the columnar cache, so finding the features never reads the whole file
+    key = source_signature(csv_path, ',')
+    name = 'features'
+    if streaming:
+        from streaming_features import build_streaming_features, STREAMING_MAX_ROWS
+        key = hashlib.sha256(f'{key}:{STREAMING_MAX_ROWS}'.encode()).hexdigest()[:16]
+        name = 'features-stream'
+
+    with feature_sets_lock:
+        if key in feature_sets:
+            return feature_sets[key]
+
+        output_dir = os.path.join(CACHE_DIR, f'{name}-{key}')
+        if not os.path.exists(os.path.join(output_dir, 'features.json')):
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            if streaming:
+                print("Building the training features of the weather dataset in chunks")
+                build_streaming_features(csv_path, output_dir)
+            else:
+                print("Building the training features of the weather dataset")
+                FeatureSet.build(read_dataset(csv_path)).save(output_dir)
+            remove_stale_versions(name, output_dir)
+
+        feature_sets.clear()
+        feature_sets[key] = FeatureSet.load(output_dir)
+        return feature_sets[key]
+
+if __name__ == '__main__':
+    get_feature_set()
+    print(f"Features saved into {CACHE_DIR}")
@@ -0,0 +1,150 @@
+from multi_regression import regression_date_predict_batch
+from isolation_forest import detect_anomalies
+from randomforest_classifier import classify_weather_batch
+from forecast_table import get_forecast_table
+from metrics import metrics, city_label
+from lru_cache import LRUCache
+from datetime import datetime
+import hashlib
+import os
+
+# Helper function to get the season
+def get_season(date_str):
+    date = datetime.strptime(date_str, '%Y-%m-%d')
+    month = date.month
+    day = date.day
+    if (month == 12 and day >= 1) or (month in [1, 2]):
+        return 'Summer'
+    elif (month == 3 and day >= 1) or (month in [4, 5]):
+        return 'Autumn'
+    elif (month == 6 and day >= 1) or (month in [7, 8]):
+        return 'Winter'
+    elif (month == 9 and day >= 1) or (month in [10, 11]):
+        return 'Spring'
+
+# Version of the values computed from the models, to be increased whenever the meaning of a stored value changes
+# 2: the day and night reliability are based on the predicted class probability instead of the test accuracy
+RESULTS_VERSION = 2
+
+# Version of the trained models, changing whenever any artifact in the models folder is retrained
+# It also covers RESULTS_VERSION, so the forecast table, anomaly summary, forecast cache and response ETags built by older code are ignored
+def compute_model_version(models_dir='models'):
+    try:
+        entries = sorted(os.scandir(models_dir), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return None
+    signature = [
+        (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+        for entry in entries if entry.name.endswith('.joblib')
+    ]
+    return hashlib.sha1(repr((RESULTS_VERSION, signature)).encode()).hexdigest()[:16]
+
+# Version published by the training orchestrator of the API, so requests do not scan the models folder to build their cache keys
+published_version = {'version': None}
+
+# Work out the version of the trained models again, called by the training orchestrator whenever the artifacts may have changed
+def publish_model_version():
+    published_version['version'] = compute_model_version()
+
+# Version of the trained models, as last published by the training orchestrator, or scanned from the models folder by the scripts without one
+def get_model_version():
+    return published_version['version'] or compute_model_version()
+
+# Shared forecast cache of the classification pipeline
+forecast_cache = LRUCache(
+    max_size=int(os.environ.get('FORECAST_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('FORECAST_CACHE_TTL', 3600))
+)
+
+# Run the regression, anomaly detection and classification models for a list of dates in a city
+# Each stage is timed separately so that the /metrics endpoint shows where the time goes
+def run_pipeline(days_str, city_code, multiregression_model, clf, label_encoder, accuracy):
+    city = city_label(city_code)
+
+    # Getting the variables data for every date at once using the multi-output regression model
+    with metrics.timer('regression', city=city):
+        predictions = regression_date_predict_batch(days_str, city_code, multiregression_model)
+
+    # Using the output of the regression model to determine if there is an anomaly on each date
+    with metrics.timer('anomaly_detection', city=city):
+        anomalies = detect_anomalies(predictions, city_code)
+
+    with metrics.timer('season_lookup', city=city):
+        seasons = [get_season(day_str) for day_str in days_str]
+
+    # Using the classification model predictor on the output of the regression model and the anomaly scores for every date at once
+    with metrics.timer('classification', city=city):
+        classifications = classify_weather_batch(
+            clf, label_encoder, accuracy,
+            min_temps=[prediction['MinTemp'] for prediction in predictions],
+            max_temps=[prediction['MaxTemp'] for prediction in predictions],
+            humidities=[prediction['Humidity'] for prediction in predictions],
+            windspeeds=[prediction['WindGustSpeed'] for prediction in predictions],
+            uvs=[prediction['UVIEF'] for prediction in predictions],
+            seasons=seasons,
+            anomaly_scores=anomalies['anomaly_score'].tolist()
+        )
+    return predictions, anomalies, classifications
+
+# Get the classification forecast of each date in the format returned by the API
+def compute_classifications(days_str, city_code, multiregression_model, clf, label_encoder, accuracy):
+    predictions, anomalies, classifications = run_pipeline(days_str, city_code, multiregression_model, clf, label_encoder, accuracy)
+
+    results = {}
+    for day_str, prediction, classification in zip(days_str, predictions, classifications):
+        results[day_str] = {
+            "day_forecast": classification['day_forecast'],
+            "day_reliability": classification['day_reliability'],
+            "day_confidence": classification['day_probabilities'][classification['day_forecast']],
+            "night_forecast": classification['night_forecast'],
+            "night_reliability": classification['night_reliability'],
+            "night_confidence": classification['night_probabilities'][classification['night_forecast']],
+            "min_temp": prediction['MinTemp'],
+            "max_temp": prediction['MaxTemp'],
+            "humidity": prediction['Humidity'],
+            "windspeed": prediction['WindGustSpeed'],
+            "uv": prediction['UVIEF'],
+        }
+    return results
+
+# Classification pipeline for a list of dates in a city
+# Dates are served from the materialized forecast table when it covers them, then from the forecast cache, and only the rest run through the models
+def forecast_classifications(days_str, city_code, multiregression_model, clf, label_encoder, accuracy):
+    model_version = get_model_version()
+    forecast_cache.check_version(model_version)
+
+    # Only trust the forecast table if it was built with the current models
+    table = get_forecast_table()
+    if table is not None and table.model_version != model_version:
+        table = None
+
+    results = {}
+    missing_days = []
+    table_days = 0
+    for day_str in days_str:
+        materialized = table.lookup(city_code, day_str) if table is not None else None
+        if materialized is not None:
+            results[day_str] = materialized
+            table_days += 1
+            continue
+
+        cached = forecast_cache.get((city_code, day_str, model_version))
+        if cached is None:
+            missing_days.append(day_str)
+        else:
+            results[day_str] = dict(cached)
+
+    # Count where the dates were served from
+    city = city_label(city_code)
+    metrics.inc('weather_forecast_lookups_total', table_days, source='table', city=city)
+    metrics.inc('weather_forecast_lookups_total', len(days_str) - table_days - len(missing_days), source='cache', city=city)
+    metrics.inc('weather_forecast_lookups_total', len(missing_days), source='model', city=city)
+
+    if missing_days:
+        computed = compute_classifications(missing_days, city_code, multiregression_model, clf, label_encoder, accuracy)
+        for day_str, classification in computed.items():
+            forecast_cache.put((city_code, day_str, model_version), classification)
+            results[day_str] = dict(classification)
+
+    # Keep the order of the requested dates
+    return {day_str: results[day_str] for day_str in days_str}
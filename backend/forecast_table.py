@@ -0,0 +1,63 @@
+import numpy as np
+import threading
+import os
+
+# Columns stored for every city and date of the forecast table
+VALUE_COLUMNS = [
+    'min_temp', 'max_temp', 'rainfall', 'windspeed', 'humidity', 'pressure', 'uv',
+    'anomaly_score', 'day_reliability', 'day_confidence', 'night_reliability', 'night_confidence'
+]
+
+# Precomputed classification forecasts for every city over a date range, with constant time lookups
+class ForecastTable:
+    def __init__(self, file_path):
+        data = np.load(file_path, allow_pickle=False)
+        self.cities = {str(city): i for i, city in enumerate(data['cities'])}
+        self.start = data['start'].astype('datetime64[D]')
+        self.values = data['values']                # Shape: (cities, days, columns)
+        self.forecasts = data['forecasts']          # Shape: (cities, days, 2) with the day and night class indices
+        self.classes = data['classes']
+        self.model_version = str(data['model_version'])
+        self.days = self.values.shape[1]
+
+    # Get the forecast of a city on a date, or None if it is outside the covered range
+    def lookup(self, city_code, day_str):
+        city = self.cities.get(city_code)
+        if city is None:
+            return None
+        offset = int((np.datetime64(day_str, 'D') - self.start).astype(int))
+        if offset < 0 or offset >= self.days:
+            return None
+
+        values = dict(zip(VALUE_COLUMNS, self.values[city, offset].tolist()))
+        day_class, night_class = self.forecasts[city, offset]
+        return {
+            "day_forecast": str(self.classes[day_class]),
+            "day_reliability": values['day_reliability'],
+            "day_confidence": values['day_confidence'],
+            "night_forecast": str(self.classes[night_class]),
+            "night_reliability": values['night_reliability'],
+            "night_confidence": values['night_confidence'],
+            "min_temp": values['min_temp'],
+            "max_temp": values['max_temp'],
+            "humidity": values['humidity'],
+            "windspeed": values['windspeed'],
+            "uv": values['uv'],
+        }
+
+table_path = os.environ.get('FORECAST_TABLE_PATH', 'models/forecast_table.npz')
+table_state = {'mtime': None, 'table': None}
+table_lock = threading.Lock()
+
+# Get the materialized forecast table, reloading it when the file changes, or None if it has not been built
+def get_forecast_table():
+    try:
+        mtime = os.path.getmtime(table_path)
+    except FileNotFoundError:
+        return None
+
+    with table_lock:
+        if table_state['mtime'] != mtime:
+            table_state['table'] = ForecastTable(table_path)
+            table_state['mtime'] = mtime
+        return table_state['table']
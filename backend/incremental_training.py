@@ -0,0 +1,82 @@
+from multi_regression import train_regression_model, prepare_regression_data
+from minmax_regression import train_minmax_model, prepare_minmax_data
+from isolation_forest import train_isolation_forest
+from sklearn.model_selection import train_test_split
+from artifacts import save_artifact, load_artifact, read_metadata, read_watermark
+from model_config import TRAINING_JOBS
+from features import get_feature_set
+import argparse
+import os
+
+DATASET_PATH = 'dataset/combined_weather_data.csv'
+CITY_CODES = ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']
+
+# Grow a saved multi-output random forest with extra trees fitted on the updated dataset
+# Falls back to a full retrain when the model is missing, has no watermark or the dataset has new feature columns (such as a new city)
+# The model is only loaded when trees are added to it, so a full retrain never holds the old model in memory alongside the new one
+def update_forest_regressor(name, path, prepare_data, train_model, feature_set, extra_trees):
+    rows = feature_set.watermark['rows']
+    metadata = read_metadata(path) if os.path.exists(path) else {}
+    watermark = metadata.get('watermark')
+    if watermark is not None and rows <= watermark['rows']:
+        print(f"{name} model is up to date ({watermark['rows']} rows)")
+        return False
+
+    # Models saved before their features were recorded are loaded once just to read them
+    features = metadata.get('features')
+    if watermark is not None and features is None:
+        features = list(load_artifact(path, mmap_mode=None).feature_names_in_)
+
+    X, y = prepare_data(feature_set.regression)
+    if watermark is None or list(X.columns) != features:
+        del X, y
+        print(f"Retraining {name} model from scratch")
+        train_model()
+        return True
+
+    regr = load_artifact(path, mmap_mode=None)
+    print(f"Adding {extra_trees} trees to the {name} model for {rows - watermark['rows']} new rows")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Each output has its own forest, which keeps its existing trees and only fits the extra ones
+    for i, estimator in enumerate(regr.estimators_):
+        estimator.set_params(warm_start=True, n_estimators=estimator.n_estimators + extra_trees, n_jobs=TRAINING_JOBS)
+        estimator.fit(X_train, y_train.iloc[:, i])
+        estimator.set_params(warm_start=False, n_jobs=None)
+
+    # Saving swaps the file atomically, and the running API reloads it once it notices the change
+    save_artifact(regr, path, watermark=feature_set.watermark)
+    return True
+
+# Retrain the isolation forest of every city with rows added since it was last trained
+def update_isolation_forests(feature_set):
+    updated = []
+    for city_code in CITY_CODES:
+        city_rows = feature_set.city_watermarks[city_code]['rows']
+        watermark = read_watermark(f'models/{city_code}_isolation_forest_model.joblib')
+        if watermark is not None and city_rows <= watermark['rows']:
+            continue
+
+        print(f"Retraining {city_code} isolation forest model")
+        train_isolation_forest(city_code)
+        updated.append(city_code)
+    return updated
+
+# Update every model trained on the combined weather dataset with the rows appended since its watermark
+# The classification model is trained on its own datasets, so it is not affected by new daily observations
+def update_models(extra_trees=10):
+    feature_set = get_feature_set(DATASET_PATH)
+
+    update_forest_regressor('multi-regression', 'models/multi_regression_model.joblib', prepare_regression_data, train_regression_model, feature_set, extra_trees)
+    update_forest_regressor('minmax', 'models/minmax_model.joblib', prepare_minmax_data, train_minmax_model, feature_set, extra_trees)
+    updated_cities = update_isolation_forests(feature_set)
+    print(f"Isolation forest models updated for: {', '.join(updated_cities) if updated_cities else 'none'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the trained models with the rows appended to the weather dataset")
+    parser.add_argument('--extra-trees', type=int, default=10, help="Number of trees added to each regression forest")
+    args = parser.parse_args()
+    update_models(args.extra_trees)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+import numpy as np
+import threading
+import weakref
+import shutil
+import json
+import os
+
+# Models predicted with the flat-array engine instead of sklearn, as a comma separated list of model families (or 'all')
+# The families are: minmax, multi_regression, classification and isolation
+FLAT_MODELS = {
+    family.strip() for family in os.environ.get('FLAT_INFERENCE_MODELS', '').split(',') if family.strip()
+}
+
+# Check whether a model family is predicted with the flat-array engine
+def uses_flat_engine(family):
+    return 'all' in FLAT_MODELS or family in FLAT_MODELS
+
+# Enable or disable the flat-array engine for a model family at runtime
+def set_flat_engine(family, enabled=True):
+    if enabled:
+        FLAT_MODELS.add(family)
+    else:
+        FLAT_MODELS.discard(family)
+
+# Every tree of a forest compiled into contiguous node arrays, evaluated for all rows and trees at once
+class FlatForest:
+    # Node arrays saved next to the model artifact, see save_flat_arrays
+    ARRAYS = ['feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots']
+
+    def __init__(self, trees, values, tree_features=None):
+        node_counts = [tree.node_count for tree in trees]
+        offsets = np.concatenate([[0], np.cumsum(node_counts)[:-1]]).astype(np.intp)
+
+        features, thresholds, lefts, rights, missing_lefts = [], [], [], [], []
+        for i, (tree, offset) in enumerate(zip(trees, offsets)):
+            is_leaf = tree.children_left == -1
+            nodes = np.arange(tree.node_count)
+
+            # Trees fitted on a subset of the features use the column of that subset
+            feature = np.where(is_leaf, 0, tree.feature)
+            if tree_features is not None:
+                feature = np.asarray(tree_features[i])[feature]
+            features.append(feature)
+            thresholds.append(tree.threshold)
+
+            # Leaves point to themselves, so every row can take the same number of steps
+            lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+            missing_lefts.append(tree.missing_go_to_left.astype(bool))
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.missing_left = np.concatenate(missing_lefts)
+        self.value = np.concatenate(values)
+        self.roots = offsets
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+    # Node arrays of the forest by name, with a prefix telling apart the forests of a model
+    def arrays(self, prefix):
+        arrays = {prefix + name: getattr(self, name) for name in self.ARRAYS}
+        arrays[prefix + 'max_depth'] = np.asarray(self.max_depth)
+        return arrays
+
+    # Forest built from node arrays that were already compiled, such as the memory-mapped files loaded by load_flat_arrays
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        forest = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(forest, name, arrays[prefix + name])
+        forest.max_depth = int(arrays[prefix + 'max_depth'])
+        return forest
+
+    # Index of the leaf reached by each row in each tree, with shape (rows, trees)
+    def apply(self, X):
+        X = np.asarray(X, dtype=np.float32)        # sklearn compares the inputs as float32
+        nodes = np.repeat(self.roots[np.newaxis, :], X.shape[0], axis=0)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(x), self.missing_left[nodes], x <= self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    # Average of the leaf values over the trees, summed one tree after another in the same order as sklearn
+    def mean_value(self, X):
+        leaf_values = self.value[self.apply(X)]
+        total = np.cumsum(leaf_values, axis=1)[:, -1]
+        return total / len(self.roots)
+
+# Compiled RandomForestRegressor, or MultiOutputRegressor of RandomForestRegressors
+# Every engine is either compiled from the model, or built from the node arrays saved with it when given
+class FlatRegressor:
+    def __init__(self, model, arrays=None):
+        from sklearn.multioutput import MultiOutputRegressor
+
+        forests = model.estimators_ if isinstance(model, MultiOutputRegressor) else [model]
+        self.multi_output = isinstance(model, MultiOutputRegressor)
+        if arrays is not None:
+            self.forests = [FlatForest.from_arrays(arrays, f'{i}.') for i in range(len(forests))]
+            return
+        self.forests = [
+            FlatForest([e.tree_ for e in forest.estimators_], [e.tree_.value[:, 0, 0] for e in forest.estimators_])
+            for forest in forests
+        ]
+
+    def arrays(self):
+        arrays = {}
+        for i, forest in enumerate(self.forests):
+            arrays.update(forest.arrays(f'{i}.'))
+        return arrays
+
+    def predict(self, X):
+        predictions = [forest.mean_value(X) for forest in self.forests]
+        return np.asarray(predictions).T if self.multi_output else predictions[0]
+
+# Compiled RandomForestClassifier
+class FlatClassifier:
+    def __init__(self, model, arrays=None):
+        self.classes_ = model.classes_
+        if arrays is not None:
+            self.forest = FlatForest.from_arrays(arrays, '0.')
+            return
+        self.forest = FlatForest(
+            [e.tree_ for e in model.estimators_],
+            [e.tree_.value[:, 0, :model.n_classes_] for e in model.estimators_]
+        )
+
+    def arrays(self):
+        return self.forest.arrays('0.')
+
+    def predict_proba(self, X):
+        return self.forest.mean_value(X)
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+# Compiled IsolationForest
+class FlatIsolationForest:
+    def __init__(self, model, arrays=None):
+        from sklearn.ensemble._iforest import _average_path_length
+
+        self.offset_ = model.offset_
+        if arrays is not None:
+            self.forest = FlatForest.from_arrays(arrays, '0.')
+            self.leaf_depths = arrays['leaf_depths']
+            self.denominator = arrays['denominator']
+            return
+
+        trees = [e.tree_ for e in model.estimators_]
+        subsample_features = model._max_features != model.n_features_in_
+        self.forest = FlatForest(
+            trees,
+            [np.zeros(tree.node_count) for tree in trees],
+            model.estimators_features_ if subsample_features else None
+        )
+
+        # Path length added to the depth of each leaf, matching the per-tree terms summed by sklearn
+        self.leaf_depths = np.concatenate([
+            path_lengths + average_path_lengths - 1.0
+            for path_lengths, average_path_lengths in zip(model._decision_path_lengths, model._average_path_length_per_tree)
+        ])
+        self.denominator = len(model.estimators_) * _average_path_length([model._max_samples])
+
+    def arrays(self):
+        return {**self.forest.arrays('0.'), 'leaf_depths': self.leaf_depths, 'denominator': self.denominator}
+
+    def score_samples(self, X):
+        depths = np.cumsum(self.leaf_depths[self.forest.apply(X)], axis=1)[:, -1]
+        scores = 2 ** (
+            -np.divide(depths, self.denominator, out=np.ones_like(depths), where=self.denominator != 0)
+        )
+        return -scores
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+# One compiled engine for each loaded model, built on first use
+compiled = weakref.WeakKeyDictionary()
+compiled_lock = threading.Lock()
+
+# Engine class of a trained model, or None for artifacts that are not forests (such as the scalers and label encoder)
+def engine_class(model):
+    # Scikit-Learn is already imported by then, as unpickling the model needs it
+    from sklearn.ensemble import IsolationForest, RandomForestClassifier, RandomForestRegressor
+    from sklearn.multioutput import MultiOutputRegressor
+
+    if isinstance(model, IsolationForest):
+        return FlatIsolationForest
+    if isinstance(model, RandomForestClassifier):
+        return FlatClassifier
+    if isinstance(model, RandomForestRegressor):
+        return FlatRegressor
+    if isinstance(model, MultiOutputRegressor) and all(isinstance(e, RandomForestRegressor) for e in model.estimators_):
+        return FlatRegressor
+    return None
+
+# Get the flat-array engine of a trained model
+def compile_model(model):
+    with compiled_lock:
+        engine = compiled.get(model)
+    if engine is not None:
+        return engine
+
+    engine = engine_class(model)(model)
+    with compiled_lock:
+        compiled[model] = engine
+    return engine
+
+# Folder of the flat node arrays saved next to a model artifact
+def flat_arrays_path(path):
+    return path + '.flat'
+
+# Save the compiled node arrays of a forest as uncompressed .npy files next to its artifact, along with the version of the artifact
+# Sklearn copies the node arrays of every tree when a model is unpickled, so memory-mapping the artifact does not share them,
+# while these files are memory-mapped as they are and stay in the page cache shared by every process serving the model
+def save_flat_arrays(model, path, version):
+    engine_type = engine_class(model)
+    if engine_type is None:
+        return
+
+    output_dir = flat_arrays_path(path)
+    temp_dir = output_dir + '.tmp'
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    arrays = engine_type(model).arrays()
+    for name, values in arrays.items():
+        np.save(os.path.join(temp_dir, f'{name}.npy'), values)
+    with open(os.path.join(temp_dir, 'manifest.json'), 'w') as f:
+        json.dump({'version': version, 'arrays': sorted(arrays)}, f)
+
+    # Until the new folder is in place, loading the model falls back to compiling it
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.rename(temp_dir, output_dir)
+
+# Build the engine of a model from the node arrays saved next to its artifact, memory-mapping them read-only
+# Returns None when the arrays were not saved or belong to another version of the artifact, so the engine is compiled on first use instead
+def load_flat_arrays(model, path, version):
+    output_dir = flat_arrays_path(path)
+    try:
+        with open(os.path.join(output_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if version is None or manifest['version'] != version:
+            return None
+        arrays = {name: np.load(os.path.join(output_dir, f'{name}.npy'), mmap_mode='r') for name in manifest['arrays']}
+    except (FileNotFoundError, ValueError):
+        return None
+
+    engine = engine_class(model)(model, arrays)
+    with compiled_lock:
+        compiled[model] = engine
+    return engine
+
+# Predict with a regression model, using the flat-array engine if it is enabled for the model family
+def predict(model, X, family):
+    if uses_flat_engine(family):
+        return compile_model(model).predict(X)
+    return model.predict(X)
+
+# Predict the class probabilities with a classification model, using the flat-array engine if it is enabled
+def predict_proba(model, X, family='classification'):
+    if uses_flat_engine(family):
+        return compile_model(model).predict_proba(np.asarray(X, dtype=float))
+    return model.predict_proba(X)
+
+# Score samples with an isolation forest, using the flat-array engine if it is enabled
+def score_samples(model, X, family='isolation'):
+    if uses_flat_engine(family):
+        return compile_model(model).score_samples(X)
+    return model.score_samples(X)
+
+# Check that the flat-array engine gives exactly the same outputs as sklearn for every trained model
+def verify_parity(max_rows=2000):
+    import pandas as pd
+    from artifacts import load_artifact
+    from feature_encoder import get_encoder
+    from isolation_forest import load_isolation_model
+    from dataset import read_dataset
+
+    df = read_dataset('dataset/combined_weather_data.csv').sample(frac=1, random_state=42).head(max_rows)
+    weather_columns = ['Rainfall', 'Humidity', 'Pressure', 'WindGustSpeed', 'UVIEF']
+    results = {}
+
+    # Both regression models, on the dates, cities and weather observations of the dataset
+    for family, path in [('minmax', 'models/minmax_model.joblib'), ('multi_regression', 'models/multi_regression_model.joblib')]:
+        model = load_artifact(path)
+        X = get_encoder(model).encode(
+            df['Date'].values, df['CityCode'].tolist(), **{column: df[column].fillna(0).values for column in weather_columns}
+        ).copy()
+        results[family] = np.array_equal(model.predict(X), compile_model(model).predict(X))
+
+    # Classification model, on the test dataset
+    clf, label_encoder = load_artifact('models/classification_model.joblib'), load_artifact('models/label_encoder.joblib')
+    test_data = read_dataset('dataset/test_weather_data.csv', delimiter=';').drop('Weather', axis=1)
+    test_data['Season'] = label_encoder.transform(test_data['Season'])
+    results['classification'] = np.array_equal(clf.predict_proba(test_data), compile_model(clf).predict_proba(test_data.to_numpy(dtype=float)))
+
+    # Isolation forest of every city, on that city's observations including the missing values
+    features = ['MinTemp', 'MaxTemp', 'Rainfall', 'WindGustSpeed', 'Humidity', 'Pressure', 'UVIEF', 'DayOfYear']
+    df['DayOfYear'] = df['Date'].dt.dayofyear
+    for city_code, city_df in df.groupby('CityCode'):
+        model, scaler = load_isolation_model(city_code)
+        X = scaler.transform(city_df[features])
+        results[f'isolation_{city_code}'] = np.array_equal(model.score_samples(X), compile_model(model).score_samples(X))
+
+    return results
+
+if __name__ == '__main__':
+    parity = verify_parity()
+    for name, identical in parity.items():
+        print(f"{name}: {'identical' if identical else 'MISMATCH'}")
+    raise SystemExit(0 if all(parity.values()) else 1)
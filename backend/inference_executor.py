@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
+import asyncio
+import os
+
+# Raised when too many inference calls are already running or waiting
+class InferenceQueueFullError(Exception):
+    pass
+
+# Bounded thread pool that runs CPU-bound inference off the asyncio event loop
+# At most max_workers calls run at once and at most max_queue more wait for a free worker, any further call is rejected
+class InferenceExecutor:
+    def __init__(self, max_workers=4, max_queue=32):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+        self.in_flight = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    # Run a function in the pool and wait for its result without blocking the event loop
+    async def run(self, func, *args, **kwargs):
+        with self.lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise InferenceQueueFullError(f"Too many requests in progress ({self.in_flight}), please try again later")
+            self.in_flight += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    # Current queue depth of the executor
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': self.in_flight,
+                'running': min(self.in_flight, self.max_workers),
+                'queued': max(0, self.in_flight - self.max_workers),
+                'rejected': self.rejected
+            }
+
+# Shared executor used by the API endpoints
+inference_executor = InferenceExecutor(
+    max_workers=int(os.environ.get('INFERENCE_WORKERS', min(4, os.cpu_count() or 1))),
+    max_queue=int(os.environ.get('INFERENCE_QUEUE_SIZE', 32))
+)
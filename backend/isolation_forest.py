@@ -1,65 +1,104 @@
 import pandas as pd
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-import joblib
+import numpy as np
+from model_registry import registry
+from artifacts import save_artifact
+from inference_engine import score_samples
+from features import get_feature_set
+from model_config import TRAINING_JOBS, model_params
+
+# Input features of the isolation forest models, in the order they were trained on
+ANOMALY_FEATURES = ['MinTemp', 'MaxTemp', 'Rainfall', 'WindGustSpeed', 'Humidity', 'Pressure', 'UVIEF', 'DayOfYear']
 
 # Isolation Forest Training Function
 def train_isolation_forest(city_code):
-    # Load data and filter by city code
-    df = pd.read_csv('dataset/combined_weather_data.csv')
-    df = df[df['CityCode'] == city_code].copy()
+    # Scikit-Learn is only imported when training, so importing this module to load or use a trained model stays fast
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
 
-    # Convert Date column to datetime and extract day of the year
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['DayOfYear'] = df['Date'].dt.dayofyear
+    # Get the interpolated and median-filled observations of the city, built once for every city and cached on disk
+    feature_set = get_feature_set()
+    features = feature_set.isolation[city_code]
 
-    # Interpolate numeric columns only and handle object columns if needed
-    numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
-    df[numeric_columns] = df[numeric_columns].interpolate(method='linear')
-    
-    # Add 'DayOfYear' to the list of numeric columns for scaling
-    numeric_columns = list(numeric_columns) + ['DayOfYear']
-    
-    # Fill any remaining NaN values with median (for numeric columns only)
-    df[numeric_columns] = df[numeric_columns].fillna(df[numeric_columns].median())
-    
     # Standardize the data
     scaler = StandardScaler()
-    scaled_data = scaler.fit_transform(df[numeric_columns])
+    scaled_data = scaler.fit_transform(features)
 
-    # Prepare and train the isolation forest model using the numeric features
-    isolation_model = IsolationForest(contamination=0.05, random_state=42)
+    # Prepare and train the isolation forest model using the numeric features, with the settings chosen by tuning.py if it has been run
+    isolation_model = IsolationForest(random_state=42, n_jobs=TRAINING_JOBS, **model_params('isolation'))
     isolation_model.fit(scaled_data)
+    isolation_model.n_jobs = None       # Score on a single thread, as the requests only ever hold a few rows
     
-    # Save the trained model and scaler using joblib
-    joblib.dump(isolation_model, f'models/{city_code}_isolation_forest_model.joblib')
-    joblib.dump(scaler, f'models/{city_code}_scaler.joblib')
+    # Save the trained model and scaler in the memory-mappable artifact format
+    save_artifact(isolation_model, f'models/{city_code}_isolation_forest_model.joblib', watermark=feature_set.city_watermarks[city_code])
+    save_artifact(scaler, f'models/{city_code}_scaler.joblib', watermark=feature_set.city_watermarks[city_code])
+
+    # Drop any previously loaded copies so the new model is used straight away
+    registry.invalidate(f'models/{city_code}_isolation_forest_model.joblib')
+    registry.invalidate(f'models/{city_code}_scaler.joblib')
+
+# Get the isolation forest model and scaler of a city from the model registry
+def load_isolation_model(city_code):
+    model = registry.load(f'models/{city_code}_isolation_forest_model.joblib')
+    scaler = registry.load(f'models/{city_code}_scaler.joblib')
+    return model, scaler
 
 # Isolation Forest Predictor Function
 def detect_anomaly(weather_data, city_code):
-    try:
-        model = joblib.load(f'models/{city_code}_isolation_forest_model.joblib')
-        scaler = joblib.load(f'models/{city_code}_scaler.joblib')
-    except FileNotFoundError:
-        print(f"Model or scaler for {city_code} not found.")
+    # Scoring the single observation as a batch of one row, leaving the input dictionary untouched
+    anomalies = detect_anomalies(pd.DataFrame([weather_data]), city_code)
+    if anomalies is None:
         return None
 
-    # Add DayOfYear to the input features
-    features = ['MinTemp', 'MaxTemp', 'Rainfall', 'WindGustSpeed', 'Humidity', 'Pressure', 'UVIEF', 'DayOfYear']
-    
-    # Convert the date to day of the year
-    weather_data['DayOfYear'] = pd.to_datetime(weather_data['Date']).dayofyear
-    weather_data.pop('Date')  # Remove the date column after extracting 'DayOfYear'
+    return {
+        'anomaly_label': anomalies['anomaly_label'].iloc[0],
+        'anomaly_score': anomalies['anomaly_score'].iloc[0]
+    }
 
-    # Create a DataFrame with the features and scale it
-    new_input_df = pd.DataFrame([weather_data], columns=features)
-    new_input_scaled = scaler.transform(new_input_df)
+# Isolation Forest Batch Predictor Function
+# Observations can be a DataFrame (or list of dictionaries) with a Date or DayOfYear column, or an array with the feature columns in order
+# The city code can be a single code for every row, a list with one code per row, or None to use the CityCode column
+def detect_anomalies(observations, city_code=None):
+    features = ANOMALY_FEATURES
 
-    # Calculate anomaly score and label
-    anomaly_score = model.decision_function(new_input_scaled)[0]
-    anomaly_label = model.predict(new_input_scaled)[0]
+    if isinstance(observations, np.ndarray):
+        observations = pd.DataFrame(observations, columns=features)
+    elif not isinstance(observations, pd.DataFrame):
+        observations = pd.DataFrame(observations)
 
-    return {
-        'anomaly_label': anomaly_label,
-        'anomaly_score': anomaly_score
-    }
\ No newline at end of file
+    # Convert the dates to day of the year if needed
+    input_df = observations.copy()
+    if 'DayOfYear' not in input_df.columns:
+        input_df['DayOfYear'] = pd.to_datetime(input_df['Date']).dt.dayofyear
+    input_df = input_df.reindex(columns=features)
+
+    # Get the city of each row
+    if city_code is None:
+        city_codes = observations['CityCode'].to_numpy()
+    elif isinstance(city_code, str):
+        city_codes = np.full(len(observations), city_code)
+    else:
+        city_codes = np.asarray(city_code)
+
+    anomaly_scores = np.zeros(len(observations))
+    anomaly_labels = np.ones(len(observations), dtype=int)
+
+    # Score the rows of each city together with that city's scaler and model
+    for city in np.unique(city_codes):
+        try:
+            model, scaler = load_isolation_model(city)
+        except FileNotFoundError:
+            print(f"Model or scaler for {city} not found.")
+            return None
+
+        rows = np.flatnonzero(city_codes == city)
+        scaled_input = scaler.transform(input_df.iloc[rows])
+
+        # Calculate the anomaly scores with a single pass over the trees, then derive the labels from the scores
+        scores = score_samples(model, scaled_input) - model.offset_
+        anomaly_scores[rows] = scores
+        anomaly_labels[rows] = np.where(scores < 0, -1, 1)
+
+    return pd.DataFrame({
+        'anomaly_label': anomaly_labels,
+        'anomaly_score': anomaly_scores
+    }, index=observations.index)
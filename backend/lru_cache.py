@@ -0,0 +1,52 @@
+from collections import OrderedDict
+import threading
+import time
+
+# Bounded LRU cache with a time to live, shared across requests
+class LRUCache:
+    def __init__(self, max_size=4096, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Drop every cached entry once the models have been retrained
+    def check_version(self, model_version):
+        with self.lock:
+            if model_version != self.model_version:
+                self.entries.clear()
+                self.model_version = model_version
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    # Hit and miss counters of the cache
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries)
+            }
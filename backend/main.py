@@ -1,10 +1,16 @@
-from multi_regression import train_regression_model, load_regression_model, regression_date_predict
-from isolation_forest import train_isolation_forest, detect_anomaly
-from randomforest_classifier import train_classification_model, load_classification_model, classify_weather
-from minmax_regression import train_minmax_model, load_minmax_model, minmax_predict
+from multi_regression import train_regression_model, load_regression_model, regression_date_predict_batch
+from isolation_forest import train_isolation_forest, detect_anomalies
+from randomforest_classifier import train_classification_model, load_classification_model, classify_weather_batch
+from minmax_regression import train_minmax_model, load_minmax_model, minmax_predict_batch
 from datetime import datetime, timedelta
+import argparse
 import os
 
+CITY_CODES = ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']
+
+# Models loaded (or trained) the first time a menu option needs them, so each option only waits for its own models
+loaded_models = {}
+
 # Supporting function to retrieve season from inputted date based on Australian season
 def get_season(date_str):
     date = datetime.strptime(date_str, '%Y-%m-%d')
@@ -21,10 +27,10 @@ def get_season(date_str):
         return 'Spring'
 
 # Function to train the isolation forest model for each city
-def train_isolation():
+def train_isolation(city_codes=CITY_CODES):
 
     # Loop through each city code
-    for city_code in ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']:
+    for city_code in city_codes:
         model_path = f'models/{city_code}_isolation_forest_model.joblib'
         scaler_path = f'models/{city_code}_scaler.joblib'
 
@@ -36,6 +42,13 @@ def train_isolation():
         else:
             print(f"{city_code} Isolation Model and Scaler already trained.")
 
+# Function to get a model, loading or training it on first use
+def get_model(name, load):
+    if name not in loaded_models:
+        print(f"Loading {name} model...")
+        loaded_models[name] = load()
+    return loaded_models[name]
+
 # Function to ask users to input a city and encode it to the city codes
 def choose_city():
     cities = ['melbourne', 'sydney', 'perth', 'brisbane', 'darwin', 'hobart']
@@ -56,15 +69,14 @@ def predict_minmax(city_code, date, model, rainfall, humidity, pressure, wind_gu
     # Setting a date range for previous and following 5 days from the inputted date
     target_date = datetime.strptime(date, '%Y-%m-%d')
     dates_range = [target_date + timedelta(days=i) for i in range(-5, 6)]
+    days_str = [day.strftime('%Y-%m-%d') for day in dates_range]
+
+    # Using the minmax temperature model predictor for every date in the range at once
+    predictions = minmax_predict_batch(days_str, city_code, rainfall, humidity, pressure, wind_gust_speed, uv_index, model)
 
     print("\n--- Min-Max Temperature Predictions for Trend Dates ---")
     # Loop through each date in the date range
-    for day in dates_range:
-        day_str = day.strftime('%Y-%m-%d')
-
-        # Using the minmax temperature model predictor
-        prediction = minmax_predict(day_str, city_code, rainfall, humidity, pressure, wind_gust_speed, uv_index, model)
-        
+    for day, day_str, prediction in zip(dates_range, days_str, predictions):
         # Printing the results
         if day == target_date:
             print(f"\n--- Full Details for {day_str} ---")
@@ -78,14 +90,11 @@ def predict_anomaly(city_code, date, mintemp, maxtemp, rainfall, humidity, press
     # Setting a date range for previous and following 5 days from the inputted date
     target_date = datetime.strptime(date, '%Y-%m-%d')
     dates_range = [target_date + timedelta(days=i) for i in range(-5, 6)]
+    days_str = [day.strftime('%Y-%m-%d') for day in dates_range]
 
-    print("\n--- Anomaly Detection Results for Trend Dates ---")
-    # Loop through each date in the date range
-    for day in dates_range:
-        day_str = day.strftime('%Y-%m-%d')
-
-        # Converting the inputs into a single list data
-        weather_data = {
+    # Converting the inputs into one row of data for each date
+    weather_data = [
+        {
             'Date': day_str,
             'MinTemp': mintemp,
             'MaxTemp': maxtemp,
@@ -95,9 +104,16 @@ def predict_anomaly(city_code, date, mintemp, maxtemp, rainfall, humidity, press
             'Pressure': pressure,
             'UVIEF': uv_index
         }
+        for day_str in days_str
+    ]
+
+    # Using the anomaly detection predictor for every date at once
+    anomalies = detect_anomalies(weather_data, city_code)
 
-        # Using the anomaly detection predictor
-        anomaly = detect_anomaly(weather_data, city_code)
+    print("\n--- Anomaly Detection Results for Trend Dates ---")
+    # Loop through each date in the date range
+    for i, (day, day_str) in enumerate(zip(dates_range, days_str)):
+        anomaly = anomalies.iloc[i]
         is_anomalous = "Yes" if anomaly['anomaly_label'] < 0 else "No"
 
         # Printing the results
@@ -112,33 +128,29 @@ def classification_predict(city_code, date, model, clf, label_encoder, accuracy)
     # Setting a date range for previous and following 5 days from the inputted date
     target_date = datetime.strptime(date, '%Y-%m-%d')
     dates_range = [target_date + timedelta(days=i) for i in range(-5, 6)]
+    days_str = [day.strftime('%Y-%m-%d') for day in dates_range]
 
     print("\nFetching weather classification predictions...")
-    # Loop through each date in the date range
-    for day in dates_range:
-        day_str = day.strftime('%Y-%m-%d')
-
-        # First using the multi-output regression model to get data for all variables based on date and city only
-        prediction = regression_date_predict(day_str, city_code, model)
-
-        # Using the regression output for input of the anomaly detection model
-        anomaly = detect_anomaly(prediction, city_code)
-
-        # Getting the season of the inputted date
-        season = get_season(day_str)
-
-        # Using output from both regression and anomaly detection model as inputs for the classifier model
-        classification = classify_weather(
-            clf, label_encoder, accuracy,
-            min_temp=prediction['MinTemp'],
-            max_temp=prediction['MaxTemp'],
-            humidity=prediction['Humidity'],
-            windspeed=prediction['WindGustSpeed'],
-            uv=prediction['UVIEF'],
-            season=season,
-            anomaly_score=anomaly['anomaly_score']
-        )
+    # First using the multi-output regression model to get data for all variables based on date and city only
+    predictions = regression_date_predict_batch(days_str, city_code, model)
+
+    # Using the regression output for input of the anomaly detection model
+    anomalies = detect_anomalies(predictions, city_code)
+
+    # Using output from both regression and anomaly detection model as inputs for the classifier model, with the season of each date
+    classifications = classify_weather_batch(
+        clf, label_encoder, accuracy,
+        min_temps=[prediction['MinTemp'] for prediction in predictions],
+        max_temps=[prediction['MaxTemp'] for prediction in predictions],
+        humidities=[prediction['Humidity'] for prediction in predictions],
+        windspeeds=[prediction['WindGustSpeed'] for prediction in predictions],
+        uvs=[prediction['UVIEF'] for prediction in predictions],
+        seasons=[get_season(day_str) for day_str in days_str],
+        anomaly_scores=anomalies['anomaly_score'].tolist()
+    )
 
+    # Loop through each date in the date range
+    for day, day_str, prediction, classification in zip(dates_range, days_str, predictions, classifications):
         # Printing the results, if it is the inputted date, print the specific details
         if day == target_date:
             print(f"\n--- Full Weather Details for {day_str} ---")
@@ -156,18 +168,17 @@ def classification_predict(city_code, date, model, clf, label_encoder, accuracy)
 
 # Main execution code
 def main():
-    # Training all the models first one the code is executed
-    print("Training multi-regression model...")
-    multiregression_model = load_regression_model()
-
-    print("Training isolation forest models...")
-    train_isolation()
-    
-    print("Training classification model...")
-    clf, label_encoder, accuracy = load_classification_model()
-    
-    print("Training Min-Max regression model...")
-    minmax_model = load_minmax_model()
+    parser = argparse.ArgumentParser(description="Interactive menu to forecast the weather with the trained models")
+    parser.add_argument('--warmup', action='store_true', help="Train and load every model before showing the menu, instead of when first needed")
+    args = parser.parse_args()
+
+    # Training and loading all the models before showing the menu when run with --warmup, otherwise each model is loaded when first needed
+    if args.warmup:
+        get_model('multi-regression', load_regression_model)
+        print("Training isolation forest models...")
+        train_isolation()
+        get_model('classification', load_classification_model)
+        get_model('Min-Max regression', load_minmax_model)
 
     again = True
     while again:
@@ -189,6 +200,7 @@ def main():
             uv_index = input("Enter UV index value: ")
 
             # Predicting the MinMax Temperature
+            minmax_model = get_model('Min-Max regression', load_minmax_model)
             predict_minmax(city_code, date, minmax_model, rainfall, humidity, pressure, wind_gust_speed, uv_index)
 
         # User chooses the Anomaly Detection Model
@@ -208,6 +220,7 @@ def main():
             uv_index = input("Enter UV index value: ")
 
             # Retrieving the Anomaly Detection Values
+            train_isolation([city_code])
             predict_anomaly(city_code, date, mintemp, maxtemp, rainfall, humidity, pressure, wind_gust_speed, uv_index)
 
         # User chooses the Weather Classification Model
@@ -220,6 +233,9 @@ def main():
             date = input("Enter a date (YYYY-MM-DD): ")
 
             # Getting the result of the Classified Weather
+            multiregression_model = get_model('multi-regression', load_regression_model)
+            clf, label_encoder, accuracy = get_model('classification', load_classification_model)
+            train_isolation([city_code])
             classification_predict(city_code, date, multiregression_model, clf, label_encoder, accuracy)
 
         choice = input("Do you want to use another model (Y/N)? ")
@@ -0,0 +1,81 @@
+from multi_regression import load_regression_model
+from isolation_forest import train_isolation_forest
+from randomforest_classifier import load_classification_model
+from forecast_pipeline import run_pipeline, get_model_version
+from forecast_table import VALUE_COLUMNS, table_path
+from datetime import datetime, timedelta
+import numpy as np
+import argparse
+import os
+
+CITY_CODES = ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']
+
+# Precompute the regression, anomaly score and day/night classification of every city over a date range
+def materialize_forecasts(start_date, end_date, output_path=table_path, chunk_days=366):
+    # Loading (or training) the models used by the classification pipeline
+    multiregression_model = load_regression_model()
+    clf, label_encoder, accuracy = load_classification_model()
+    for city_code in CITY_CODES:
+        if not os.path.exists(f'models/{city_code}_isolation_forest_model.joblib') or not os.path.exists(f'models/{city_code}_scaler.joblib'):
+            train_isolation_forest(city_code)
+
+    total_days = (end_date - start_date).days + 1
+    days_str = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(total_days)]
+    classes = np.asarray(clf.classes_).astype(str)
+
+    values = np.zeros((len(CITY_CODES), total_days, len(VALUE_COLUMNS)))
+    forecasts = np.zeros((len(CITY_CODES), total_days, 2), dtype=np.int16)
+
+    for city, city_code in enumerate(CITY_CODES):
+        # Run the pipeline in chunks of dates so each model call stays a reasonable size
+        for chunk_start in range(0, total_days, chunk_days):
+            chunk = days_str[chunk_start:chunk_start + chunk_days]
+            predictions, anomalies, classifications = run_pipeline(chunk, city_code, multiregression_model, clf, label_encoder, accuracy)
+
+            rows = slice(chunk_start, chunk_start + len(chunk))
+            values[city, rows] = [
+                [
+                    prediction['MinTemp'], prediction['MaxTemp'], prediction['Rainfall'], prediction['WindGustSpeed'],
+                    prediction['Humidity'], prediction['Pressure'], prediction['UVIEF'], anomaly_score,
+                    classification['day_reliability'], classification['day_probabilities'][classification['day_forecast']],
+                    classification['night_reliability'], classification['night_probabilities'][classification['night_forecast']]
+                ]
+                for prediction, anomaly_score, classification in zip(predictions, anomalies['anomaly_score'], classifications)
+            ]
+            forecasts[city, rows, 0] = np.searchsorted(classes, [str(c['day_forecast']) for c in classifications])
+            forecasts[city, rows, 1] = np.searchsorted(classes, [str(c['night_forecast']) for c in classifications])
+
+        print(f"Materialized {city_code} forecasts for {total_days} days")
+
+    # Write to a temporary file first so the API never reads a half-written table
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(
+            f,
+            cities=np.asarray(CITY_CODES),
+            start=np.datetime64(start_date.strftime('%Y-%m-%d'), 'D'),
+            values=values,
+            forecasts=forecasts,
+            classes=classes,
+            model_version=np.asarray(get_model_version())
+        )
+    os.replace(temp_path, output_path)
+    print(f"Forecast table saved to {output_path}")
+
+def main():
+    today = datetime.today()
+    parser = argparse.ArgumentParser(description="Precompute the classification forecasts of every city over a date range")
+    parser.add_argument('--start', default=f'{today.year}-01-01', help="First date of the range (YYYY-MM-DD)")
+    parser.add_argument('--end', default=f'{today.year + 1}-12-31', help="Last date of the range (YYYY-MM-DD)")
+    parser.add_argument('--output', default=table_path, help="Path of the forecast table file")
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start, '%Y-%m-%d')
+    end_date = datetime.strptime(args.end, '%Y-%m-%d')
+    if end_date < start_date:
+        parser.error("The end date must not be before the start date")
+
+    materialize_forecasts(start_date, end_date, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+import functools
+import threading
+import bisect
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# City codes used as metric labels, any other city code is grouped under 'other' to keep the number of series bounded
+CITY_CODES = ['MEL', 'SYD', 'PER', 'BNE', 'DAR', 'HOB']
+
+def city_label(city_code):
+    return city_code if city_code in CITY_CODES else 'other'
+
+# Escape a label value for the Prometheus text format
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}'
+
+# In-process counters and histograms, rendered in the Prometheus text format when the /metrics endpoint is scraped
+# Recording a value only updates a few numbers under a lock, and everything else is left until the metrics are rendered
+class Metrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.descriptions = {}
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    # Register the type and help text of a metric
+    def describe(self, name, kind, help_text):
+        self.descriptions[name] = (kind, help_text)
+
+    # Register a function called on every scrape that returns (name, kind, help text, labels, value) tuples,
+    # used for the statistics already kept by other components such as the model registry and the caches
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    # Time a stage of a prediction pipeline
+    @contextmanager
+    def timer(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('weather_stage_duration_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    # Wrap a function so that every call to it is timed as a stage
+    def timed(self, func, stage, **labels):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.timer(stage, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+    # Render every metric in the Prometheus text exposition format
+    def render(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: ([*value[0]], value[1], value[2]) for key, value in self.histograms.items()}
+
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append(f'{name}{format_labels(labels)} {value}')
+
+        for (name, labels), (bucket_counts, total, count) in histograms.items():
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        descriptions = dict(self.descriptions)
+        for collector in self.collectors:
+            for name, kind, help_text, labels, value in collector():
+                descriptions.setdefault(name, (kind, help_text))
+                samples.setdefault(name, []).append(f'{name}{format_labels(sorted(labels.items()))} {value}')
+
+        output = []
+        for name in sorted(samples):
+            kind, help_text = descriptions.get(name, ('untyped', ''))
+            output.append(f'# HELP {name} {help_text}')
+            output.append(f'# TYPE {name} {kind}')
+            output.extend(samples[name])
+        return '\n'.join(output) + '\n'
+
+# ASGI middleware recording the duration and status of every request, labelled with the matched route rather than the raw path
+class MetricsMiddleware:
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            endpoint = getattr(route, 'path', 'unmatched')
+            self.metrics.observe('weather_request_duration_seconds', time.perf_counter() - start, endpoint=endpoint, status=status)
+
+# Shared metrics of the back-end server
+metrics = Metrics()
+metrics.describe('weather_request_duration_seconds', 'histogram', "Time taken to answer each request, including the JSON serialization")
+metrics.describe('weather_stage_duration_seconds', 'histogram', "Time taken by each stage of the prediction pipelines")
+metrics.describe('weather_request_errors_total', 'counter', "Requests that failed with an unexpected error")
+metrics.describe('weather_forecast_lookups_total', 'counter', "Classification forecast dates by where they were served from")
+metrics.describe('weather_response_cache_total', 'counter', "Forecast responses by whether they were computed, served from the response cache or not modified")
+metrics.describe('weather_csv_loads_total', 'counter', "Times a weather dataset CSV file was read from disk")
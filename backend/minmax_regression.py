@@ -1,84 +1,74 @@
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.multioutput import MultiOutputRegressor
-from sklearn.model_selection import train_test_split
-import joblib
+from model_config import TRAINING_JOBS, model_params
+from artifacts import save_artifact, load_artifact
+from feature_encoder import get_encoder
+from inference_engine import predict
+from features import get_feature_set
 import os
 
+# Split the shared regression features of the weather dataset into the input features and target variables of the MinMax Temp Regression Model
+def prepare_minmax_data(features):
+    X = features.drop(columns=['MinTemp', 'MaxTemp'])
+    y = features[['MinTemp', 'MaxTemp']]
+    return X, y
+
 # MinMax Temp Regression Training Function
 def train_minmax_model():
-    # Load data from a CSV file
-    df = pd.read_csv('dataset/combined_weather_data.csv')
-    df = df.dropna(subset=['MinTemp', 'MaxTemp', 'Rainfall', 'WindGustSpeed', 'Humidity', 'Pressure', 'UVIEF'])
-
-    # Convert Date column to datetime
-    df['Date'] = pd.to_datetime(df['Date'])
-
-    # Extract date-related features
-    df['Year'] = df['Date'].dt.year
-    df['Month'] = df['Date'].dt.month
-    df['Day'] = df['Date'].dt.day
-    df['DayOfYear'] = df['Date'].dt.dayofyear
+    # Scikit-Learn is only imported when training, so importing this module to load or use a trained model stays fast
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.multioutput import MultiOutputRegressor
+    from sklearn.model_selection import train_test_split
 
-    # Remove original Date column
-    df.drop('Date', axis=1, inplace=True)
-
-    # Convert CityCode to one-hot encoded columns
-    df = pd.get_dummies(df, columns=['CityCode'])
-
-    # Define input features and target variables
-    X = df.drop(columns=['MinTemp', 'MaxTemp'])
-    y = df[['MinTemp', 'MaxTemp']]
+    # Get the date features and city encodings of the weather dataset, built once and shared with the other models
+    feature_set = get_feature_set()
+    X, y = prepare_minmax_data(feature_set.regression)
 
     # Split the data into training and test sets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-    # Initialize and fit the model
-    regr = MultiOutputRegressor(RandomForestRegressor(n_estimators=200, random_state=42))
+    # Initialize and fit the model, with the settings chosen by tuning.py if it has been run
+    regr = MultiOutputRegressor(RandomForestRegressor(random_state=42, n_jobs=TRAINING_JOBS, **model_params('minmax')))
     regr.fit(X_train, y_train)
 
-    joblib.dump(regr, 'models/minmax_model.joblib')
+    # Predict on a single thread, as the requests only ever hold a few rows
+    for estimator in regr.estimators_:
+        estimator.n_jobs = None
+
+    save_artifact(regr, 'models/minmax_model.joblib', watermark=feature_set.watermark)
     return regr
 
 # Load existing model if exists, else train the model
 def load_minmax_model():
-    return joblib.load('models/minmax_model.joblib') if os.path.exists('models/minmax_model.joblib') else train_minmax_model()
+    return load_artifact('models/minmax_model.joblib') if os.path.exists('models/minmax_model.joblib') else train_minmax_model()
 
 # MinMax Temp Regression Predictor Function
 def minmax_predict(date, city_code, rainfall, humidity, pressure, wind_gust_speed, uv_index, model):
-    # Extracting date-related features from the input
-    date = pd.to_datetime(date)
-    year, month, day, day_of_year = date.year, date.month, date.day, date.dayofyear
-
-    # Create a dictionary with input data
-    input_data = {
-        'Year': [year],
-        'Month': [month],
-        'Day': [day],
-        'DayOfYear': [day_of_year],
-        'Rainfall': [rainfall],
-        'Humidity': [humidity],
-        'Pressure': [pressure],
-        'WindGustSpeed': [wind_gust_speed],
-        'UVIEF': [uv_index]
-    }
-
-    # One-hot encode the city code
-    feature_names = model.feature_names_in_
-    for code in feature_names:
-        input_data[code] = [1 if code.endswith(city_code) else 0]
-
-    # Convert to DataFrame and reindex to match the order of features in the model
-    input_data_df = pd.DataFrame(input_data)
-    input_data_df = input_data_df.reindex(columns=feature_names, fill_value=0)
-
-    # Make prediction using the trained model
-    prediction = model.predict(input_data_df)
-
-    # Return the prediction
-    return {
-        'Date': date,
-        'MinTemp': prediction[0][0],
-        'MaxTemp': prediction[0][1]
-    }
-
+    return minmax_predict_batch([date], city_code, rainfall, humidity, pressure, wind_gust_speed, uv_index, model)[0]
+
+# MinMax Temp Regression Batch Predictor Function, predicting every date with a single model call
+# The city code and weather inputs can either be a single value used for every date or a list with one value per date
+def minmax_predict_batch(dates, city_code, rainfall, humidity, pressure, wind_gust_speed, uv_index, model):
+    dates = pd.to_datetime(dates)
+
+    # Encode the inputs straight into an array matching the order of features in the model
+    input_data = get_encoder(model).encode(
+        dates.values, city_code,
+        Rainfall=rainfall,
+        Humidity=humidity,
+        Pressure=pressure,
+        WindGustSpeed=wind_gust_speed,
+        UVIEF=uv_index
+    )
+
+    # Make predictions for all the rows at once using the trained model
+    predictions = predict(model, input_data, 'minmax')
+
+    # Return one prediction per date
+    return [
+        {
+            'Date': date,
+            'MinTemp': prediction[0],
+            'MaxTemp': prediction[1]
+        }
+        for date, prediction in zip(dates, predictions)
+    ]
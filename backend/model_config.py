@@ -0,0 +1,30 @@
+import json
+import os
+
+# Number of cores used to fit the trees of each forest, -1 uses every available core
+TRAINING_JOBS = int(os.environ.get('TRAINING_JOBS', -1))
+
+# Default settings of each model family, used when no tuned settings have been saved
+DEFAULT_PARAMS = {
+    'multi_regression': {'n_estimators': 325},
+    'minmax': {'n_estimators': 200},
+    'classification': {'n_estimators': 96},
+    'isolation': {'contamination': 0.05}
+}
+
+# Settings chosen by tuning.py, read by the training functions
+TUNED_CONFIG_PATH = os.environ.get('TUNED_CONFIG_PATH', 'models/tuned_config.json')
+
+# Get the settings of a model family, with the tuned settings (if any) taking precedence over the defaults
+def model_params(family):
+    params = dict(DEFAULT_PARAMS[family])
+    try:
+        with open(TUNED_CONFIG_PATH) as f:
+            tuned = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return params
+
+    selected = tuned.get(family, {}).get('selected')
+    if selected is not None:
+        params.update(selected['params'])
+    return params
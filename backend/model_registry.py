@@ -0,0 +1,46 @@
+from artifacts import load_artifact
+import threading
+import os
+
+# Registry that keeps loaded model artifacts in memory and reloads them when the file changes on disk
+class ModelRegistry:
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Get an artifact by its file path, only loading it from disk on the first use or after it has changed
+    def load(self, path):
+        mtime = os.path.getmtime(path)      # Raises FileNotFoundError if the artifact does not exist
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == mtime:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        artifact = load_artifact(path)
+        with self.lock:
+            self.entries[path] = (mtime, artifact)
+        return artifact
+
+    # Remove a single artifact (or every artifact if no path is given) so that it is loaded again on next use
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(path, None)
+
+    # Hit and miss counters of the registry
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'loaded': len(self.entries)
+            }
+
+# Shared registry used by all the model modules
+registry = ModelRegistry()
@@ -1,15 +1,21 @@
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score
-import joblib
+import numpy as np
+from model_config import TRAINING_JOBS, model_params
+from artifacts import save_artifact, load_artifact
+from inference_engine import predict_proba
+from dataset import read_dataset
 import os
 
 # Random Forest Classification Model Training Function
 def train_classification_model():
+    # Scikit-Learn is only imported when training, so importing this module to load or use a trained model stays fast
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score
+
     # Load the training data
-    train_data = pd.read_csv('dataset/train_weather_data.csv', delimiter=';')
-    test_data = pd.read_csv('dataset/test_weather_data.csv', delimiter=';')
+    train_data = read_dataset('dataset/train_weather_data.csv', delimiter=';')
+    test_data = read_dataset('dataset/test_weather_data.csv', delimiter=';')
 
     # Split features and target
     X_train = train_data.drop('Weather', axis=1)
@@ -22,52 +28,77 @@ def train_classification_model():
     X_train['Season'] = label_encoder.fit_transform(X_train['Season'])
     X_test['Season'] = label_encoder.transform(X_test['Season'])
 
-    # Train the model
-    clf = RandomForestClassifier(n_estimators=96, random_state=42)
+    # Train the model, with the settings chosen by tuning.py if it has been run
+    clf = RandomForestClassifier(random_state=42, n_jobs=TRAINING_JOBS, **model_params('classification'))
     clf.fit(X_train, y_train)
+    clf.n_jobs = None       # Predict on a single thread, as the requests only ever hold a few rows
 
     # Calculate accuracy on test data
     accuracy = accuracy_score(y_test, clf.predict(X_test))
 
-    joblib.dump(clf, 'models/classification_model.joblib')
-    joblib.dump(label_encoder, 'models/label_encoder.joblib')
-    joblib.dump(accuracy, 'models/accuracy.joblib')
+    save_artifact(clf, 'models/classification_model.joblib')
+    save_artifact(label_encoder, 'models/label_encoder.joblib')
+    save_artifact(accuracy, 'models/accuracy.joblib')
     return clf, label_encoder, accuracy
 
 # Load existing model if exists, else train the model
 def load_classification_model():
     clf_path, encoder_path, accuracy_path = 'models/classification_model.joblib', 'models/label_encoder.joblib', 'models/accuracy.joblib'
     if os.path.exists(clf_path) and os.path.exists(encoder_path) and os.path.exists(accuracy_path):
-        clf, encoder, accuracy = joblib.load(clf_path), joblib.load(encoder_path), joblib.load(accuracy_path)
-        return clf, encoder, accuracy  # Placeholder accuracy if not recalculated
+        clf, encoder, accuracy = load_artifact(clf_path), load_artifact(encoder_path), load_artifact(accuracy_path)
+        return clf, encoder, accuracy
     else:
         return train_classification_model()
 
 # Random Forest Classification Model Predictor Function
 def classify_weather(clf, label_encoder, accuracy, min_temp, max_temp, humidity, windspeed, uv, season, anomaly_score):
-    # Prepare input for predictions
-    night_input = [[min_temp, humidity, windspeed, uv, season]]
-    day_input = [[max_temp, humidity, windspeed, uv, season]]
+    return classify_weather_batch(clf, label_encoder, accuracy, [min_temp], [max_temp], [humidity], [windspeed], [uv], [season], [anomaly_score])[0]
+
+# Random Forest Classification Model Batch Predictor Function
+# Classifies the night and day rows of every input with a single predict_proba call
+# The reliability is based on the probability of the predicted class, or on the overall test accuracy when use_confidence is unset
+def classify_weather_batch(clf, label_encoder, accuracy, min_temps, max_temps, humidities, windspeeds, uvs, seasons, anomaly_scores, use_confidence=True):
+    count = len(min_temps)
 
-    # Encode the 'Season' feature in the input data
-    night_input[0][4] = label_encoder.transform([night_input[0][4]])[0]
-    day_input[0][4] = label_encoder.transform([day_input[0][4]])[0]
+    # Encode each distinct season only once
+    distinct_seasons = sorted(set(seasons))
+    season_codes = dict(zip(distinct_seasons, label_encoder.transform(distinct_seasons)))
 
-    # Make predictions
-    night_forecast = clf.predict(night_input)
-    day_forecast = clf.predict(day_input)
+    # Prepare input for predictions, with the night rows first followed by the day rows
+    inputs = np.empty((2 * count, 5))
+    inputs[:count, 0] = min_temps
+    inputs[count:, 0] = max_temps
+    inputs[:, 1] = np.tile(np.asarray(humidities, dtype=float), 2)
+    inputs[:, 2] = np.tile(np.asarray(windspeeds, dtype=float), 2)
+    inputs[:, 3] = np.tile(np.asarray(uvs, dtype=float), 2)
+    inputs[:, 4] = np.tile([season_codes[season] for season in seasons], 2)
+    if hasattr(clf, 'feature_names_in_'):
+        inputs = pd.DataFrame(inputs, columns=clf.feature_names_in_)
+
+    # Make predictions, taking the most probable class of each row just as clf.predict does
+    probabilities = predict_proba(clf, inputs)
+    best = np.argmax(probabilities, axis=1)
+    forecasts = clf.classes_.take(best)
+    confidences = probabilities[np.arange(len(best)), best]
 
     # Calculate reliability
     def calculate_reliability(accuracy, anomaly_score):
         reliability_adjustment = max(0, 1 + anomaly_score) if anomaly_score < 0 else 1
         return min(100, accuracy * 100 * reliability_adjustment)
 
-    night_reliability = calculate_reliability(accuracy, anomaly_score)
-    day_reliability = calculate_reliability(accuracy, anomaly_score)
+    results = []
+    for i in range(count):
+        night, day = i, count + i
+        night_reliability = calculate_reliability(confidences[night] if use_confidence else accuracy, anomaly_scores[i])
+        day_reliability = calculate_reliability(confidences[day] if use_confidence else accuracy, anomaly_scores[i])
+
+        results.append({
+            'night_forecast': forecasts[night],
+            'night_reliability': night_reliability,
+            'night_probabilities': dict(zip(clf.classes_, probabilities[night])),
+            'day_forecast': forecasts[day],
+            'day_reliability': day_reliability,
+            'day_probabilities': dict(zip(clf.classes_, probabilities[day]))
+        })
 
-    return {
-        'night_forecast': night_forecast[0],
-        'night_reliability': night_reliability,
-        'day_forecast': day_forecast[0],
-        'day_reliability': day_reliability
-    }
+    return results
@@ -0,0 +1,110 @@
+from lru_cache import LRUCache
+import threading
+import hashlib
+import json
+import time
+import os
+
+# Cache of rendered API responses, keyed by an ETag computed from the endpoint, the normalized request and the model and dataset versions
+# The responses are kept in a bounded in-process LRU cache, and optionally in a folder on disk shared between server processes
+# The disk copies expire after the same time to live, and every few writes the expired ones and the oldest beyond disk_max_entries are removed
+class ResponseCache:
+    def __init__(self, max_size=1024, ttl=3600, disk_dir=None, disk_max_entries=10000, prune_interval=100):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self.prune_interval = prune_interval
+        self.disk_writes = 0
+        self.lock = threading.Lock()
+
+    # Strong ETag of a response, changing whenever the request, the models or the dataset change
+    @staticmethod
+    def etag(endpoint, payload, version):
+        key = json.dumps([endpoint, payload, version], sort_keys=True, separators=(',', ':'))
+        return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+    def disk_path(self, etag):
+        name = etag.strip('"')
+        return os.path.join(self.disk_dir, name[:2], name + '.json')
+
+    # Get the rendered body of a response, checking the disk cache when it is not held in memory
+    def get(self, etag):
+        body = self.memory.get(etag)
+        if body is not None or self.disk_dir is None:
+            return body
+
+        path = self.disk_path(etag)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        self.memory.put(etag, body)
+        return body
+
+    # Store the rendered body of a response, writing the disk copy under a temporary name first so other processes never read a partial file
+    def put(self, etag, body):
+        self.memory.put(etag, body)
+        if self.disk_dir is None:
+            return
+
+        path = self.disk_path(etag)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp{os.getpid()}'
+        with open(temp_path, 'wb') as f:
+            f.write(body)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self.disk_writes += 1
+            prune = self.disk_writes % self.prune_interval == 0
+        if prune:
+            self.prune_disk()
+
+    # Remove the disk copies older than the time to live, then the oldest ones until at most disk_max_entries are left
+    # Several processes can prune the same folder at once, so files removed by another process are skipped
+    def prune_disk(self):
+        now = time.time()
+        entries = []
+        expired = []
+        for folder in os.scandir(self.disk_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                try:
+                    mtime = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if now - mtime > self.ttl:
+                    expired.append(entry.path)
+                elif entry.name.endswith('.json'):      # Temporary files still being written are left alone
+                    entries.append((mtime, entry.path))
+
+        entries.sort()
+        for path in expired + [path for _, path in entries[:max(0, len(entries) - self.disk_max_entries)]]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return self.memory.stats()
+
+# Check whether an If-None-Match request header matches the ETag of a response
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+# Shared response cache of the deterministic forecast endpoints
+response_cache = ResponseCache(
+    max_size=int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 3600)),
+    disk_dir=os.environ.get('RESPONSE_CACHE_DIR') or None,
+    disk_max_entries=int(os.environ.get('RESPONSE_CACHE_DISK_SIZE', 10000))
+)
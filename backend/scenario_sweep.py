@@ -0,0 +1,110 @@
+from isolation_forest import load_isolation_model, ANOMALY_FEATURES
+from feature_encoder import get_encoder
+from inference_engine import predict, score_samples
+import numpy as np
+import base64
+import os
+
+# Largest number of scenarios evaluated by a single sweep, and the number of scenarios encoded and predicted at a time
+# Only one chunk of encoded inputs exists at once, so the memory used by a sweep is the chunk plus its float32 results
+SWEEP_MAX_POINTS = int(os.environ.get('SWEEP_MAX_POINTS', 500000))
+SWEEP_CHUNK_ROWS = int(os.environ.get('SWEEP_CHUNK_ROWS', 8192))
+
+# Axes of a sweep, in the order of the dimensions of its results, with the model feature of each weather input
+SWEEP_AXES = ['date', 'rainfall', 'humidity', 'pressure', 'wind_gust_speed', 'uv_index']
+AXIS_FEATURES = {
+    'rainfall': 'Rainfall',
+    'humidity': 'Humidity',
+    'pressure': 'Pressure',
+    'wind_gust_speed': 'WindGustSpeed',
+    'uv_index': 'UVIEF'
+}
+
+# Values of a sweep axis, given either as a single value, a list of values or an inclusive range with a step
+def axis_values(values):
+    if isinstance(values, dict):
+        start, stop, step = values['start'], values['stop'], values['step']
+        if step <= 0 or stop < start:
+            raise ValueError("A range needs a positive step and a stop no lower than its start")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        if count > SWEEP_MAX_POINTS:
+            raise ValueError(f"A range can hold at most {SWEEP_MAX_POINTS} values")
+        return start + step * np.arange(count)
+
+    values = np.atleast_1d(np.asarray(values, dtype=float))
+    if values.ndim != 1 or len(values) == 0:
+        raise ValueError("Every sweep variable needs at least one value")
+    return values
+
+# Cartesian product of the dates and weather inputs of a sweep, built one chunk of scenarios at a time instead of all at once
+class SweepGrid:
+    def __init__(self, dates, **inputs):
+        self.axes = {'date': np.asarray(dates, dtype='datetime64[D]').reshape(-1)}
+        if len(self.axes['date']) == 0:
+            raise ValueError("A sweep needs at least one date")
+        for name in SWEEP_AXES[1:]:
+            self.axes[name] = axis_values(inputs[name])
+
+        self.shape = tuple(len(values) for values in self.axes.values())
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        if self.size > SWEEP_MAX_POINTS:
+            raise ValueError(f"The sweep has {self.size} scenarios, more than the limit of {SWEEP_MAX_POINTS}")
+
+    # Inputs of the scenarios from start to stop, in row-major order over the axes
+    def chunk(self, start, stop):
+        indices = np.unravel_index(np.arange(start, stop), self.shape)
+        return {name: values[index] for (name, values), index in zip(self.axes.items(), indices)}
+
+# Predict the minimum and maximum temperature of every scenario of a sweep, and score it with the city's isolation forest
+# The anomaly scores are computed from the predicted temperatures along with the scenario's weather inputs
+def evaluate_sweep(grid, city_code, minmax_model, anomalies=True, chunk_rows=SWEEP_CHUNK_ROWS):
+    min_temp = np.empty(grid.size, dtype=np.float32)
+    max_temp = np.empty(grid.size, dtype=np.float32)
+    anomaly_score = np.empty(grid.size, dtype=np.float32) if anomalies else None
+    if anomalies:
+        isolation_model, scaler = load_isolation_model(city_code)
+    encoder = get_encoder(minmax_model)
+
+    for start in range(0, grid.size, chunk_rows):
+        stop = min(start + chunk_rows, grid.size)
+        inputs = grid.chunk(start, stop)
+
+        # Encode the chunk straight into the model's feature order and predict every scenario with a single model call
+        features = {AXIS_FEATURES[name]: inputs[name] for name in AXIS_FEATURES}
+        encoded = encoder.encode(inputs['date'], city_code, **features)
+        predictions = predict(minmax_model, encoded, 'minmax')
+        min_temp[start:stop] = predictions[:, 0]
+        max_temp[start:stop] = predictions[:, 1]
+
+        if anomalies:
+            dates = inputs['date']
+            observations = {
+                **features,
+                'MinTemp': predictions[:, 0],
+                'MaxTemp': predictions[:, 1],
+                'DayOfYear': (dates - dates.astype('datetime64[Y]')).astype(int) + 1
+            }
+            scaled_input = scaler.transform(np.column_stack([observations[name] for name in ANOMALY_FEATURES]))
+            anomaly_score[start:stop] = score_samples(isolation_model, scaled_input) - isolation_model.offset_
+
+    results = {'min_temp': min_temp, 'max_temp': max_temp}
+    if anomalies:
+        results['anomaly_score'] = anomaly_score
+    return results
+
+# Compact payload of a sweep, with the values of each axis once and the results as flat row-major arrays of the grid's shape
+# The results are either lists rounded to 4 decimals, or base64 encoded little-endian float32 arrays
+def sweep_payload(grid, results, encoding='list'):
+    payload = {
+        'axes': {name: values.astype(str).tolist() if name == 'date' else values.tolist() for name, values in grid.axes.items()},
+        'shape': list(grid.shape),
+        'encoding': encoding
+    }
+    for name, values in results.items():
+        if encoding == 'base64':
+            payload[name] = base64.b64encode(values.astype('<f4').tobytes()).decode('ascii')
+        else:
+            payload[name] = np.round(values.astype(float), 4).tolist()
+    if 'anomaly_score' in results:
+        payload['anomalies'] = int((results['anomaly_score'] < 0).sum())
+    return payload
@@ -0,0 +1,91 @@
+import argparse
+import signal
+import socket
+import time
+import gc
+import os
+
+# Production server that trains and loads the models once in a parent process and then forks the workers
+# The workers share the parent's memory copy-on-write, and the memory-mapped node arrays of the flat-array engine through the page cache,
+# so every added worker only costs the memory of its own requests instead of a full copy of the models
+# The forests are predicted with the flat-array engine unless FLAT_INFERENCE_MODELS picks the model families using it
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with several worker processes sharing the loaded models")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    import uvicorn
+    import api
+    from inference_engine import set_flat_engine
+
+    if not os.environ.get('FLAT_INFERENCE_MODELS'):
+        set_flat_engine('all')
+
+    # Train any missing models under the training lock and load all of them, before any worker exists
+    api.orchestrator.warmup = True
+    api.orchestrator.run()
+    api.get_store('dataset/combined_weather_data.csv')
+    readiness = api.orchestrator.readiness()
+    if not readiness['ready']:
+        raise SystemExit(f"Some models could not be loaded: {readiness['errors']}")
+
+    # Move everything loaded so far out of the garbage collector's reach, so collections in the workers do not copy the shared pages
+    gc.collect()
+    gc.freeze()
+
+    # Every worker accepts connections from the same listening socket
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    def run_worker():
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        config = uvicorn.Config(api.app, lifespan='on', log_level='info')
+        uvicorn.Server(config).run(sockets=[sock])
+        os._exit(0)
+
+    def fork_worker():
+        pid = os.fork()
+        if pid == 0:
+            run_worker()
+        return pid
+
+    workers = {fork_worker() for _ in range(args.workers)}
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Replace any worker that exits unexpectedly, until the server is stopped
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, starting a new one")
+            time.sleep(1)
+            workers.add(fork_worker())
+
+    sock.close()
+
+if __name__ == '__main__':
+    main()
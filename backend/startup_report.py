@@ -0,0 +1,105 @@
+from benchmark import endpoint_payload
+from collections import defaultdict
+import subprocess
+import argparse
+import httpx
+import time
+import json
+import sys
+import os
+
+# Import time of a module in a fresh interpreter, as reported by python -X importtime
+# Returns the total time, the time spent in each top-level package and the slowest imports including their own imports, in milliseconds
+def import_breakdown(module, top=15):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, check=True)
+
+    packages = defaultdict(float)
+    imports = []
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us) / 1000
+        imports.append((name.rstrip(), int(cumulative_us) / 1000))
+        if name.strip() == module:
+            total = int(cumulative_us) / 1000
+
+    return {
+        'total_ms': total,
+        'packages': dict(sorted(packages.items(), key=lambda item: -item[1])[:top]),
+        'slowest': sorted(imports, key=lambda item: -item[1])[:top]
+    }
+
+# Time from starting the server process to the first response of an endpoint, along with the time it first accepted a connection
+def time_to_first_response(endpoint, warmup, port, timeout=600):
+    env = {**os.environ, 'MODEL_WARMUP': '1' if warmup else '0'}
+    env.pop('RESPONSE_CACHE_DIR', None)      # Responses cached on disk by an earlier run would skip the models
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api:app', '--port', str(port), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    accepted = None
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=timeout) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    response = client.post(endpoint, json=endpoint_payload(endpoint, 0))
+                except httpx.TransportError:
+                    time.sleep(0.01)
+                    continue
+
+                # Answers with a 503 status mean the models are still training, any other answer has gone through the models
+                # and has to be a success, as the time to an error response says nothing about the startup
+                accepted = accepted or time.perf_counter() - start
+                if response.status_code != 503:
+                    if not 200 <= response.status_code < 300:
+                        raise RuntimeError(f"{endpoint} answered with a {response.status_code} status: {response.text[:200]}")
+                    return {'first_connection_s': accepted, 'first_response_s': time.perf_counter() - start, 'status': response.status_code}
+                time.sleep(0.01)
+        raise TimeoutError(f"{endpoint} did not answer within {timeout} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+def print_imports(module, breakdown):
+    print(f"\nimport {module}: {breakdown['total_ms']:.0f} ms")
+    print("  Time spent in each package:")
+    for package, ms in breakdown['packages'].items():
+        print(f"    {package:<40} {ms:>8.1f} ms")
+    print("  Slowest imports, including the modules they import:")
+    for name, ms in breakdown['slowest']:
+        print(f"    {name:<60} {ms:>8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the import time of the back-end modules and the time to the first response of each endpoint")
+    parser.add_argument('--modules', default='api,main', help="Comma-separated modules to time the import of")
+    parser.add_argument('--endpoints', default='/predict_minmax,/predict_anomaly,/classification_predict', help="Comma-separated endpoints to time the first response of")
+    parser.add_argument('--warmup', choices=['on', 'off', 'both'], default='both', help="Whether the server loads every model in the background at startup")
+    parser.add_argument('--top', type=int, default=15, help="Number of packages and imports listed")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help="Optional file to save the results to as JSON")
+    args = parser.parse_args()
+
+    results = {'imports': {}, 'first_response': {}}
+    for module in args.modules.split(','):
+        results['imports'][module] = import_breakdown(module, args.top)
+        print_imports(module, results['imports'][module])
+
+    print("\nTime to first response from starting the server:")
+    modes = {'on': [True], 'off': [False], 'both': [True, False]}[args.warmup]
+    for endpoint in args.endpoints.split(','):
+        for warmup in modes:
+            result = time_to_first_response(endpoint, warmup, args.port)
+            results['first_response'][f"{endpoint} (warmup {'on' if warmup else 'off'})"] = result
+            print(f"  {endpoint:<25} warmup {'on ' if warmup else 'off'}  first connection {result['first_connection_s']:.2f} s, first response {result['first_response_s']:.2f} s (status {result['status']})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
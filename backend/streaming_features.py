@@ -0,0 +1,232 @@
+from features import FeatureSet, WEATHER_COLUMNS
+from dataset import allocate_columns, publish, DATE_COLUMNS
+from collections import Counter
+import pandas as pd
+import numpy as np
+import json
+import os
+
+# Number of CSV rows parsed at a time, and the largest number of rows kept for the regression models and for the isolation forest of each city
+# Only one chunk of the CSV is held in memory at once, and the features are written straight into memory-mapped float32 columns,
+# so the memory used to build the features and train the forests is bounded by these settings rather than the size of the dataset
+STREAMING_CHUNK_ROWS = int(os.environ.get('STREAMING_CHUNK_ROWS', 100000))
+STREAMING_MAX_ROWS = int(os.environ.get('STREAMING_MAX_ROWS', 1000000))
+
+# Read a CSV file one chunk of rows at a time
+def read_chunks(csv_path, chunk_rows):
+    header = pd.read_csv(csv_path, nrows=0).columns
+    return pd.read_csv(csv_path, chunksize=chunk_rows, parse_dates=[column for column in DATE_COLUMNS if column in header])
+
+# Rows of a chunk grouped by stratum, which is the city and month of each row
+def strata(chunk):
+    city = chunk['CityCode'].astype(object).fillna('').to_numpy()
+    month = chunk['Date'].dt.month.fillna(0).astype(int).to_numpy()
+    return chunk.groupby([city, month], sort=False).indices
+
+# Count the rows of every stratum, along with the watermarks of the dataset and of each city, without holding more than a chunk in memory
+def scan_dataset(csv_path, chunk_rows):
+    regression_counts = Counter()
+    city_counts = Counter()
+    city_last_dates = {}
+    rows = 0
+    last_date = None
+    columns = None
+
+    for chunk in read_chunks(csv_path, chunk_rows):
+        columns = [column for column in chunk.columns if column not in ('Date', 'CityCode')]
+        complete = chunk[WEATHER_COLUMNS].notna().all(axis=1).to_numpy()
+        for key, indices in strata(chunk).items():
+            regression_counts[key] += int(complete[indices].sum())
+            if key[0]:
+                city_counts[key] += len(indices)
+
+        rows += len(chunk)
+        chunk_last_date = chunk['Date'].max()
+        if last_date is None or chunk_last_date > last_date:
+            last_date = chunk_last_date
+        for city_code, city_last_date in chunk.groupby('CityCode')['Date'].max().items():
+            if city_code not in city_last_dates or city_last_date > city_last_dates[city_code]:
+                city_last_dates[city_code] = city_last_date
+
+    city_codes = sorted(city_last_dates)
+    city_rows = Counter()
+    for (city_code, _), count in city_counts.items():
+        city_rows[city_code] += count
+
+    return {
+        'columns': columns,
+        'city_codes': city_codes,
+        'regression_counts': regression_counts,
+        'city_counts': city_counts,
+        'watermark': {'rows': rows, 'last_date': str(last_date)[:10]},
+        'city_watermarks': {city_code: {'rows': city_rows[city_code], 'last_date': str(city_last_dates[city_code])[:10]} for city_code in city_codes}
+    }
+
+# Pick the rows kept from each stratum, in proportion to its size, so a subsample keeps the mix of cities and seasons of the whole dataset
+# Returns the sorted positions of the kept rows within each stratum, or None when every row fits
+def sample_strata(counts, max_rows, seed=42):
+    total = sum(counts.values())
+    if total <= max_rows:
+        return None
+
+    keys = sorted(counts)
+    shares = np.array([counts[key] * max_rows / total for key in keys])
+    quotas = np.floor(shares).astype(int)
+
+    # Hand out the rows left over by rounding down to the strata with the largest remainders
+    for i in np.argsort(quotas - shares, kind='stable')[:max_rows - quotas.sum()]:
+        quotas[i] += 1
+
+    rng = np.random.default_rng(seed)
+    return {key: np.sort(rng.choice(counts[key], quota, replace=False)) for key, quota in zip(keys, quotas)}
+
+# Mark the rows of a chunk kept by a sample, counting the rows of each stratum seen so far to know their position within it
+def select_rows(groups, sample, seen, size):
+    keep = np.zeros(size, dtype=bool)
+    for key, indices in groups.items():
+        positions = np.arange(seen[key], seen[key] + len(indices))
+        seen[key] += len(indices)
+        if sample is None:
+            keep[indices] = True
+            continue
+
+        kept = sample.get(key, np.empty(0, dtype=int))
+        found = np.searchsorted(kept, positions)
+        keep[indices] = (found < len(kept)) & (kept[np.minimum(found, len(kept) - 1)] == positions)
+    return keep
+
+# Linear interpolation of the missing values of one column streamed in chunks, giving the same values as pandas' interpolate(method='linear')
+# Missing values are only resolved once the next known value arrives, and the ones before the first known value are left for the median
+class GapFiller:
+    def __init__(self, output):
+        self.output = output
+        self.last_position = None
+        self.last_value = None
+        self.pending_positions = np.empty(0, dtype=np.int64)
+        self.pending_slots = np.empty(0, dtype=np.int64)
+
+    # Add the values of a chunk, with their positions among the city's rows and the output slot of the kept rows (-1 for the others)
+    def add(self, positions, values, slots):
+        known = ~np.isnan(values)
+        kept = slots >= 0
+        self.output[slots[kept & known]] = values[kept & known]
+
+        fill_positions = np.concatenate([self.pending_positions, positions[kept & ~known]])
+        fill_slots = np.concatenate([self.pending_slots, slots[kept & ~known]])
+        known_positions = positions[known]
+        known_values = values[known]
+        if self.last_position is not None:
+            known_positions = np.concatenate([[self.last_position], known_positions])
+            known_values = np.concatenate([[self.last_value], known_values])
+
+        if len(known_positions) == 0:
+            self.pending_positions, self.pending_slots = fill_positions, fill_slots
+            return
+
+        waiting = fill_positions > known_positions[-1]
+        leading = fill_positions < known_positions[0]
+        between = ~waiting & ~leading
+        self.output[fill_slots[between]] = np.interp(fill_positions[between], known_positions, known_values)
+        self.output[fill_slots[leading]] = np.nan
+
+        self.pending_positions, self.pending_slots = fill_positions[waiting], fill_slots[waiting]
+        self.last_position, self.last_value = known_positions[-1], known_values[-1]
+
+    # Values still missing after the last known value take that value, as pandas does
+    def finish(self):
+        self.output[self.pending_slots] = np.nan if self.last_position is None else self.last_value
+
+# Build the features of a dataset by streaming it in chunks, with the same columns as FeatureSet.build stored as float32
+# The rows are subsampled per city and month when there are more than max_rows of them, and the folder can be read with FeatureSet.load
+def build_streaming_features(csv_path, output_dir, max_rows=STREAMING_MAX_ROWS, chunk_rows=STREAMING_CHUNK_ROWS):
+    scan = scan_dataset(csv_path, chunk_rows)
+    columns = scan['columns']
+    city_codes = scan['city_codes']
+    regression_columns = columns + ['Year', 'Month', 'Day', 'DayOfYear'] + [f'CityCode_{city_code}' for city_code in city_codes]
+    isolation_columns = columns + ['DayOfYear']
+
+    regression_sample = sample_strata(scan['regression_counts'], max_rows)
+    city_samples = {
+        city_code: sample_strata({key: count for key, count in scan['city_counts'].items() if key[0] == city_code}, max_rows)
+        for city_code in city_codes
+    }
+    regression_rows = max_rows if regression_sample is not None else sum(scan['regression_counts'].values())
+    city_rows = {city_code: min(max_rows, scan['city_watermarks'][city_code]['rows']) for city_code in city_codes}
+
+    temp_dir = f'{output_dir}.tmp{os.getpid()}'
+    regression = allocate_columns(os.path.join(temp_dir, 'regression'), regression_columns, regression_rows)
+    isolation = {city_code: allocate_columns(os.path.join(temp_dir, f'isolation_{city_code}'), isolation_columns, city_rows[city_code]) for city_code in city_codes}
+    gap_fillers = {city_code: {column: GapFiller(isolation[city_code][column]) for column in columns} for city_code in city_codes}
+
+    regression_seen = Counter()
+    city_seen = Counter()
+    city_positions = Counter()
+    regression_written = 0
+    city_written = Counter()
+    for chunk in read_chunks(csv_path, chunk_rows):
+        chunk = chunk.reset_index(drop=True)
+        groups = strata(chunk)
+        dates = chunk['Date'].dt
+        date_features = {'Year': dates.year, 'Month': dates.month, 'Day': dates.day, 'DayOfYear': dates.dayofyear}
+
+        # Regression features of the complete rows kept by the sample
+        complete = chunk[WEATHER_COLUMNS].notna().all(axis=1).to_numpy()
+        complete_groups = {key: indices[complete[indices]] for key, indices in groups.items()}
+        keep = select_rows(complete_groups, regression_sample, regression_seen, len(chunk))
+        slots = slice(regression_written, regression_written + int(keep.sum()))
+        for column in columns:
+            regression[column][slots] = chunk[column].to_numpy(dtype=float)[keep]
+        for name, values in date_features.items():
+            regression[name][slots] = values.to_numpy(dtype=float)[keep]
+        city = chunk['CityCode'].astype(object).to_numpy()[keep]
+        for city_code in city_codes:
+            regression[f'CityCode_{city_code}'][slots] = city == city_code
+        regression_written = slots.stop
+
+        # Isolation features of each city, interpolated across chunks over every row of the city and only kept for the sampled rows
+        for city_code in city_codes:
+            city_groups = {key: indices for key, indices in groups.items() if key[0] == city_code}
+            if not city_groups:
+                continue
+            rows = np.sort(np.concatenate(list(city_groups.values())))
+            keep = select_rows(city_groups, city_samples[city_code], city_seen, len(chunk))[rows]
+            slots = np.full(len(rows), -1, dtype=np.int64)
+            slots[keep] = np.arange(city_written[city_code], city_written[city_code] + int(keep.sum()))
+            positions = np.arange(city_positions[city_code], city_positions[city_code] + len(rows))
+            city_positions[city_code] += len(rows)
+
+            for column in columns:
+                gap_fillers[city_code][column].add(positions, chunk[column].to_numpy(dtype=float)[rows], slots)
+            isolation[city_code]['DayOfYear'][slots[keep]] = date_features['DayOfYear'].to_numpy(dtype=float)[rows][keep]
+            city_written[city_code] += int(keep.sum())
+
+    # Fill the values interpolation could not resolve with the median of each column, as featurize_isolation does
+    for city_code in city_codes:
+        for column in columns:
+            gap_fillers[city_code][column].finish()
+        for values in isolation[city_code].values():
+            missing = np.isnan(values)
+            if missing.any():
+                values[missing] = np.nanmedian(values)
+            values.flush()
+    for values in regression.values():
+        values.flush()
+
+    with open(os.path.join(temp_dir, 'features.json'), 'w') as f:
+        json.dump({'watermark': scan['watermark'], 'city_watermarks': scan['city_watermarks']}, f)
+    publish(temp_dir, output_dir)
+
+if __name__ == '__main__':
+    from features import get_feature_set, DATASET_PATH
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the training features of the weather dataset by streaming it in chunks")
+    parser.add_argument('csv_path', nargs='?', default=DATASET_PATH)
+    parser.add_argument('--output', help="Folder to save the features into, instead of the dataset cache used by the training functions")
+    args = parser.parse_args()
+
+    if args.output:
+        build_streaming_features(args.csv_path, args.output)
+        print(f"Features saved into {args.output}")
+    else:
+        get_feature_set(args.csv_path, streaming=True)
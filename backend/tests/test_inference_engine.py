@@ -0,0 +1,94 @@
+from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier, IsolationForest
+from sklearn.multioutput import MultiOutputRegressor
+from inference_engine import compile_model, engine_class, save_flat_arrays, load_flat_arrays
+import pandas as pd
+import numpy as np
+import pytest
+import os
+
+# Test dataset bundled with the repository, used by the classification model
+TEST_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset', 'test_weather_data.csv')
+
+# Small random dataset, with a few missing values so both branches of the missing value handling are taken
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 6))
+    y = np.column_stack([X[:, 0] * 2 + X[:, 1], X[:, 2] - X[:, 3] ** 2])
+    X_test = rng.normal(size=(100, 6))
+    X_test[rng.random(X_test.shape) < 0.05] = np.nan
+    return X, y, X_test
+
+def test_regressor(data):
+    X, y, X_test = data
+    X[::17, 4] = np.nan
+    model = RandomForestRegressor(n_estimators=8, random_state=0).fit(X, y[:, 0])
+    assert np.array_equal(compile_model(model).predict(X_test), model.predict(X_test))
+
+def test_multi_output_regressor(data):
+    X, y, X_test = data
+    model = MultiOutputRegressor(RandomForestRegressor(n_estimators=8, random_state=0)).fit(X, y)
+    prediction = compile_model(model).predict(X_test)
+    assert prediction.shape == (len(X_test), 2)
+    assert np.array_equal(prediction, model.predict(X_test))
+
+def test_classifier(data):
+    X, y, X_test = data
+    labels = np.array(['Cloudy', 'Rainy', 'Sunny'], dtype=object)[np.digitize(y[:, 0], [-1, 1])]
+    model = RandomForestClassifier(n_estimators=8, random_state=0).fit(X, labels)
+    engine = compile_model(model)
+    assert np.array_equal(engine.predict_proba(X_test), model.predict_proba(X_test))
+    assert (engine.predict(X_test) == model.predict(X_test)).all()
+
+@pytest.mark.parametrize('max_features', [1.0, 0.5])
+def test_isolation_forest(data, max_features):
+    X, _, X_test = data
+    model = IsolationForest(n_estimators=8, max_features=max_features, contamination=0.05, random_state=0).fit(X)
+    engine = compile_model(model)
+    assert np.array_equal(engine.score_samples(X_test), model.score_samples(X_test))
+    assert np.array_equal(engine.decision_function(X_test), model.decision_function(X_test))
+
+# The node arrays saved next to an artifact give the same predictions once memory-mapped, and are ignored for another version
+def test_saved_arrays(data, tmp_path):
+    X, y, X_test = data
+    model = MultiOutputRegressor(RandomForestRegressor(n_estimators=8, random_state=0)).fit(X, y)
+    path = str(tmp_path / 'model.joblib')
+    save_flat_arrays(model, path, 'v1')
+
+    assert load_flat_arrays(model, path, 'v2') is None
+    engine = load_flat_arrays(model, path, 'v1')
+    assert isinstance(engine.forests[0].feature, np.memmap)
+    assert np.array_equal(engine.predict(X_test), model.predict(X_test))
+
+# Forests fitted on the bundled dataset as frames, the way the training functions fit them, give exactly the same outputs
+@pytest.fixture
+def weather():
+    df = pd.read_csv(TEST_DATASET, delimiter=';')
+    df['Season'] = df['Season'].astype('category').cat.codes
+    return df
+
+def test_weather_regressors(weather):
+    X = weather[['Humidity', 'Windspeed', 'UV', 'Season']]
+    regr = RandomForestRegressor(n_estimators=20, random_state=42).fit(X, weather['Temperature'])
+    assert np.array_equal(compile_model(regr).predict(X.to_numpy(dtype=float)), regr.predict(X))
+
+    X = weather[['Windspeed', 'UV', 'Season']]
+    multi = MultiOutputRegressor(RandomForestRegressor(n_estimators=20, random_state=42)).fit(X, weather[['Temperature', 'Humidity']])
+    assert np.array_equal(compile_model(multi).predict(X.to_numpy(dtype=float)), multi.predict(X))
+
+def test_weather_classifier(weather):
+    X = weather.drop('Weather', axis=1)
+    clf = RandomForestClassifier(n_estimators=20, random_state=42).fit(X, weather['Weather'])
+    engine = compile_model(clf)
+    assert np.array_equal(engine.predict_proba(X.to_numpy(dtype=float)), clf.predict_proba(X))
+    assert (engine.predict(X.to_numpy(dtype=float)) == clf.predict(X)).all()
+
+def test_weather_isolation_forest(weather):
+    from sklearn.preprocessing import StandardScaler
+
+    X = StandardScaler().fit_transform(weather[['Temperature', 'Humidity', 'Windspeed', 'UV', 'Season']])
+    model = IsolationForest(n_estimators=20, contamination=0.05, random_state=42).fit(X)
+    assert np.array_equal(compile_model(model).score_samples(X), model.score_samples(X))
+
+def test_unsupported_model():
+    assert engine_class(object()) is None
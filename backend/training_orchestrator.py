@@ -0,0 +1,272 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+import multiprocessing
+import threading
+import time
+import os
+
+# File locks are only available on Unix, elsewhere a single server process is expected
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Raised when a model is requested before it has finished training and loading
+class ModelNotReadyError(Exception):
+    pass
+
+# Run a training function in a worker process, only sending back whether it finished
+# The training functions return the fitted model, which would otherwise be pickled back to the parent just to be thrown away
+def run_training_job(train, args):
+    train(*args)
+
+# Limit the cores used by the forests of each worker process, so several workers fitting at once do not oversubscribe the machine
+# Runs before the worker unpickles any job, so the training modules read it when they are first imported
+def limit_training_jobs(training_jobs):
+    os.environ['TRAINING_JOBS'] = str(training_jobs)
+
+# Exclusive lock on a file shared by every process on the machine, held while the models are trained
+@contextmanager
+def training_lock(path):
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Trains the independent models concurrently in a process pool and loads them in the background
+# Each job is a dictionary with the artifact paths, the training and loading functions and their arguments
+# When a reload interval is given, models whose artifacts change on disk are reloaded and swapped in without a restart
+# The prepare function runs once before any training starts, to build the data shared by the training processes
+# Models that are already trained are loaded on first use, and warmup loads all of them in the background instead of waiting for a request
+# A worker process that dies (such as when it runs out of memory) takes the whole pool with it, so the unfinished jobs are retried
+# in a new pool, one job at a time, up to retries times
+# The on_change function is called when the orchestrator starts, once training finishes and after every reload check,
+# so what depends on the artifacts on disk (such as the version of the models) is worked out there rather than on every request
+class TrainingOrchestrator:
+    def __init__(self, jobs, max_workers=None, reload_interval=None, prepare=None, lock_path='models/.training.lock', warmup=True, retries=1, on_change=None):
+        self.jobs = jobs
+        self.on_change = on_change
+        self.max_workers = max_workers
+        self.retries = retries
+        self.prepare = prepare
+        self.lock_path = lock_path
+        self.reload_interval = reload_interval
+        self.warmup = warmup
+        self.status = {name: 'available' if self.is_trained(name) else 'pending' for name in jobs}
+        self.errors = {}
+        self.models = {}
+        self.loaded_mtimes = {}
+        self.lock = threading.Lock()
+        self.load_locks = {name: threading.Lock() for name in jobs}
+        self.thread = None
+        self.watcher = None
+
+    def set_status(self, name, status, error=None):
+        with self.lock:
+            self.status[name] = status
+            if error is not None:
+                self.errors[name] = str(error)
+
+    # Start training and loading in a background thread so the caller is not blocked
+    # Nothing is trained or loaded when every model is already loaded, such as by the parent process of serve.py before forking the workers,
+    # and without warmup the thread only trains the missing models
+    def start(self):
+        self.notify_change()
+        with self.lock:
+            pending = [name for name, status in self.status.items() if status != 'ready' and (self.warmup or status == 'pending')]
+        if self.thread is None and pending:
+            self.thread = threading.Thread(target=self.run, name='model-training', daemon=True)
+            self.thread.start()
+        if self.watcher is None and self.reload_interval:
+            self.watcher = threading.Thread(target=self.watch, name='model-reload', daemon=True)
+            self.watcher.start()
+
+    # Wait for every model to finish training and loading
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    # Several server processes may start at once, so the models are trained under a file lock and never by two processes at the same time
+    # A process that had to wait for the lock finds the models saved by the other one and only loads them
+    def run(self):
+        with training_lock(self.lock_path):
+            self.train_and_load()
+        self.notify_change()
+
+    # Let the owner of the orchestrator know the artifacts on disk may have changed
+    def notify_change(self):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change()
+        except Exception as e:
+            print(f"Handling the change of the models failed: {e}")
+
+    def train_and_load(self):
+        # Only the models without saved artifacts need training
+        to_train = [name for name in self.jobs if not self.is_trained(name)]
+        if not to_train:
+            self.warm_up(self.jobs)
+            return
+
+        if self.prepare is not None:
+            try:
+                self.prepare()
+            except Exception as e:
+                # Each training process prepares the data it needs by itself if this fails
+                print(f"Preparing the training data failed: {e}")
+
+        max_workers = self.max_workers or min(len(to_train), os.cpu_count() or 1)
+        already_trained = [name for name in self.jobs if name not in to_train]
+        for attempt in range(self.retries + 1):
+            to_train = self.train(to_train, max_workers, already_trained)
+            already_trained = []
+            if not to_train:
+                return
+            if attempt < self.retries:
+                print(f"Retrying the training of {', '.join(to_train)} one model at a time")
+                max_workers = 1
+
+        # Out of retries, the models whose artifacts were saved before their worker died can still be loaded
+        for name in to_train:
+            if self.is_trained(name):
+                self.set_status(name, 'available')
+                self.warm_up([name])
+            else:
+                self.set_status(name, 'failed', 'The training process exited unexpectedly')
+
+    # Train some models in a new process pool, returning the ones left unfinished because a worker process died
+    def train(self, to_train, max_workers, already_trained=()):
+        training_jobs = int(os.environ.get('TRAINING_JOBS', -1))
+        if training_jobs <= 0:
+            training_jobs = max(1, (os.cpu_count() or 1) // max_workers)
+
+        unfinished = []
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=limit_training_jobs, initargs=(training_jobs,)) as pool:
+            futures = {}
+            for name in to_train:
+                job = self.jobs[name]
+                futures[pool.submit(run_training_job, job['train'], job.get('args', ()))] = name
+                self.set_status(name, 'training')
+                print(f"Training {name} model")
+
+            # Load the models that were already trained while the others are still training
+            self.warm_up(already_trained)
+
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except BrokenProcessPool:
+                    # A job whose artifacts were all saved before its worker died does not need training again
+                    if self.is_trained(name):
+                        print(f"Completed {name} model training before its worker process exited")
+                        self.set_status(name, 'available')
+                        self.warm_up([name])
+                    else:
+                        print(f"Training {name} model was interrupted by a worker process exiting")
+                        unfinished.append(name)
+                except Exception as e:
+                    self.set_status(name, 'failed', e)
+                    print(f"Training {name} model failed: {e}")
+                else:
+                    print(f"Completed {name} model training")
+                    self.set_status(name, 'available')
+                    self.warm_up([name])
+        return unfinished
+
+    # Load trained models ahead of their first use when warmup is enabled, skipping the ones a request has already loaded
+    def warm_up(self, names):
+        if self.warmup:
+            for name in names:
+                self.materialize(name)
+
+    # Check whether every artifact of a model has been saved
+    def is_trained(self, name):
+        return all(os.path.exists(path) for path in self.jobs[name]['artifacts'])
+
+    # Modification times of the artifacts of a model
+    def artifact_mtimes(self, name):
+        return tuple(os.path.getmtime(path) for path in self.jobs[name]['artifacts'])
+
+    # Load a trained model into memory so the endpoints can use it
+    # A model that is already loaded keeps serving requests until the new one has finished loading
+    def load(self, name):
+        job = self.jobs[name]
+        reloading = self.is_ready(name)
+        if not reloading:
+            self.set_status(name, 'loading')
+        try:
+            mtimes = self.artifact_mtimes(name) if all(os.path.exists(path) for path in job['artifacts']) else None
+            model = job['load'](*job.get('args', ()))
+        except Exception as e:
+            if reloading:
+                print(f"Reloading {name} model failed, keeping the previous model: {e}")
+            else:
+                self.set_status(name, 'failed', e)
+                print(f"Loading {name} model failed: {e}")
+            return
+
+        with self.lock:
+            self.models[name] = model
+            self.loaded_mtimes[name] = mtimes
+        self.set_status(name, 'ready')
+        print(f"{name} model {'reloaded' if reloading else 'ready'}")
+
+    # Periodically reload the models whose artifacts have been updated, such as by incremental training
+    def watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            for name in self.jobs:
+                if not self.is_ready(name):
+                    continue
+                try:
+                    mtimes = self.artifact_mtimes(name)
+                except FileNotFoundError:
+                    continue
+                with self.lock:
+                    changed = mtimes != self.loaded_mtimes.get(name)
+                if changed:
+                    self.load(name)
+            self.notify_change()
+
+    def is_ready(self, name):
+        with self.lock:
+            return self.status.get(name) == 'ready'
+
+    # Load a trained model unless it is already loaded, waiting for any load of the same model already in progress
+    def materialize(self, name):
+        with self.load_locks[name]:
+            if not self.is_ready(name):
+                self.load(name)
+
+    # Get a loaded model, loading it first if it is trained but has not been used yet
+    # Raises ModelNotReadyError if it is still training, or could not be loaded
+    def get(self, name):
+        with self.lock:
+            status = self.status.get(name)
+        if status in ('available', 'loading'):
+            self.materialize(name)
+
+        with self.lock:
+            if self.status.get(name) != 'ready':
+                raise ModelNotReadyError(f"The {name} model is not ready yet ({self.status.get(name, 'unknown')})")
+            return self.models[name]
+
+    # Status of every model, along with any training errors
+    def readiness(self):
+        with self.lock:
+            return {
+                'ready': all(status in ('ready', 'available') for status in self.status.values()),
+                'models': dict(self.status),
+                'errors': dict(self.errors)
+            }
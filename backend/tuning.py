@@ -0,0 +1,248 @@
+from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier, IsolationForest
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.model_selection import KFold, train_test_split
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.metrics import mean_absolute_error, accuracy_score
+from model_config import DEFAULT_PARAMS, TUNED_CONFIG_PATH
+from inference_engine import predict, predict_proba, score_samples
+from joblib import Parallel, delayed
+import numpy as np
+import itertools
+import argparse
+import tempfile
+import joblib
+import time
+import json
+import os
+
+FAMILIES = ['multi_regression', 'minmax', 'classification', 'isolation']
+
+# Settings tried for each model family
+DEFAULT_GRIDS = {
+    'multi_regression': {'n_estimators': [50, 100, 200, 325], 'max_depth': [None, 12, 20]},
+    'minmax': {'n_estimators': [50, 100, 200, 325], 'max_depth': [None, 12, 20]},
+    'classification': {'n_estimators': [32, 64, 96, 160], 'max_depth': [None, 8, 16]},
+    'isolation': {'n_estimators': [50, 100, 200], 'max_samples': ['auto', 512]}
+}
+
+# Name of the quality metric of each family, and whether a higher value is better
+METRICS = {
+    'multi_regression': ('mae', False),
+    'minmax': ('mae', False),
+    'classification': ('accuracy', True),
+    'isolation': ('anomaly_rate_error', False)
+}
+
+# Objectives compared by the Pareto report, all of them lower is better
+OBJECTIVES = ['loss', 'single_row_ms', 'batch_ms', 'artifact_bytes']
+
+# Training and test splits of each family, the same splits the training functions use
+# The isolation forests are evaluated on every city, so they have one split per city
+def load_splits(family):
+    if family in ('multi_regression', 'minmax'):
+        from features import get_feature_set
+        from multi_regression import prepare_regression_data
+        from minmax_regression import prepare_minmax_data
+        prepare_data = prepare_regression_data if family == 'multi_regression' else prepare_minmax_data
+        X, y = prepare_data(get_feature_set().regression)
+        X_train, X_test, y_train, y_test = train_test_split(X.to_numpy(dtype=float), y.to_numpy(), test_size=0.2, random_state=42)
+        return [(X_train, X_test, y_train, y_test)]
+
+    if family == 'classification':
+        from dataset import read_dataset
+        train_data = read_dataset('dataset/train_weather_data.csv', delimiter=';')
+        test_data = read_dataset('dataset/test_weather_data.csv', delimiter=';')
+        label_encoder = LabelEncoder()
+        X_train = train_data.drop('Weather', axis=1)
+        X_test = test_data.drop('Weather', axis=1)
+        X_train['Season'] = label_encoder.fit_transform(X_train['Season'])
+        X_test['Season'] = label_encoder.transform(X_test['Season'])
+        return [(X_train.to_numpy(dtype=float), X_test.to_numpy(dtype=float), np.asarray(train_data['Weather']), np.asarray(test_data['Weather']))]
+
+    from features import get_feature_set
+    splits = []
+    for features in get_feature_set().isolation.values():
+        X_train, X_test = train_test_split(features.to_numpy(dtype=float), test_size=0.2, random_state=42)
+        splits.append((X_train, X_test, None, None))
+    return splits
+
+def build_model(family, params):
+    params = {**DEFAULT_PARAMS[family], **params}
+    if family in ('multi_regression', 'minmax'):
+        return MultiOutputRegressor(RandomForestRegressor(random_state=42, n_jobs=1, **params))
+    if family == 'classification':
+        return RandomForestClassifier(random_state=42, n_jobs=1, **params)
+    return IsolationForest(random_state=42, **params)
+
+# The isolation forests are fitted on standardized observations, like in the training function
+def fit_model(family, params, X, y):
+    if family == 'isolation':
+        scaler = StandardScaler().fit(X)
+        model = build_model(family, params).fit(scaler.transform(X))
+        return (scaler, model)
+    return build_model(family, params).fit(X, y)
+
+# Run a fitted model the same way the API does
+def infer(family, model, X):
+    if family == 'isolation':
+        scaler, forest = model
+        return score_samples(forest, scaler.transform(X)) - forest.offset_
+    if family == 'classification':
+        return predict_proba(model, X)
+    return predict(model, X, family)
+
+# Quality metric of a fitted model on a test set
+def evaluate(family, model, X, y):
+    if family == 'classification':
+        return accuracy_score(y, model.predict(X))
+    if family == 'isolation':
+        # Share of the unseen observations flagged as anomalies, compared with the share expected by the contamination setting
+        anomaly_rate = (infer(family, model, X) < 0).mean()
+        return abs(anomaly_rate - model[1].contamination)
+    return mean_absolute_error(y, model.predict(X))
+
+# Cross-validate a candidate on the training split, then fit it on the whole training split and evaluate it on the test split
+# The fitted model is saved to a temporary file for measuring its size and, later on, its latency
+def evaluate_candidate(family, params, index, splits, folds, temp_dir):
+    cv_scores = []
+    holdout_scores = []
+    model_paths = []
+    fit_seconds = []
+    for i, (X_train, X_test, y_train, y_test) in enumerate(splits):
+        for train_rows, test_rows in KFold(n_splits=folds, shuffle=True, random_state=42).split(X_train):
+            model = fit_model(family, params, X_train[train_rows], None if y_train is None else y_train[train_rows])
+            cv_scores.append(evaluate(family, model, X_train[test_rows], None if y_train is None else y_train[test_rows]))
+
+        start = time.perf_counter()
+        model = fit_model(family, params, X_train, y_train)
+        fit_seconds.append(time.perf_counter() - start)
+        holdout_scores.append(evaluate(family, model, X_test, y_test))
+
+        path = os.path.join(temp_dir, f"{family}-{index}-{i}.joblib")
+        joblib.dump(model, path, compress=0)
+        model_paths.append(path)
+
+    higher_is_better = METRICS[family][1]
+    cv_score = float(np.mean(cv_scores))
+    return {
+        'params': params,
+        'cv_score': cv_score,
+        'holdout_score': float(np.mean(holdout_scores)),
+        'loss': 1 - cv_score if higher_is_better else cv_score,
+        'fit_seconds': float(np.mean(fit_seconds)),
+        'artifact_bytes': int(np.mean([os.path.getsize(path) for path in model_paths])),
+        'model_paths': model_paths
+    }
+
+# Median time of a model call in milliseconds
+def time_call(func, repeat):
+    func()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations) * 1000)
+
+# Measure the latency of the fitted candidates one at a time, so that they are not slowed down by each other
+def measure_latency(family, candidate, splits, batch_rows=1000, repeat=50):
+    single_row_ms = []
+    batch_ms = []
+    for path, (_, X_test, _, _) in zip(candidate.pop('model_paths'), splits):
+        model = joblib.load(path, mmap_mode='r')
+        batch = X_test[:batch_rows]
+        single_row_ms.append(time_call(lambda: infer(family, model, X_test[:1]), repeat))
+        batch_ms.append(time_call(lambda: infer(family, model, batch), max(1, repeat // 10)))
+        del model
+        os.remove(path)
+    candidate['single_row_ms'] = float(np.mean(single_row_ms))
+    candidate['batch_ms'] = float(np.mean(batch_ms))
+    candidate['batch_rows'] = min(batch_rows, len(splits[0][1]))
+
+def dominates(a, b):
+    return all(a[key] <= b[key] for key in OBJECTIVES) and any(a[key] < b[key] for key in OBJECTIVES)
+
+# Mark the candidates that no other candidate beats on every objective, and select the smallest of those within the tolerance of the best loss
+def pareto_report(candidates, tolerance):
+    for candidate in candidates:
+        candidate['pareto'] = not any(dominates(other, candidate) for other in candidates if other is not candidate)
+
+    front = [candidate for candidate in candidates if candidate['pareto']]
+    best_loss = min(candidate['loss'] for candidate in front)
+    eligible = [candidate for candidate in front if candidate['loss'] <= best_loss * (1 + tolerance) + 1e-12]
+    return min(eligible, key=lambda candidate: (candidate['artifact_bytes'], candidate['single_row_ms']))
+
+def tune_family(family, grid, folds, jobs, tolerance):
+    splits = load_splits(family)
+    names = list(grid)
+    candidates_params = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    print(f"Evaluating {len(candidates_params)} {family} candidates with {folds}-fold cross-validation")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        candidates = Parallel(n_jobs=jobs)(
+            delayed(evaluate_candidate)(family, params, index, splits, folds, temp_dir) for index, params in enumerate(candidates_params)
+        )
+        for candidate in candidates:
+            measure_latency(family, candidate, splits)
+
+    selected = pareto_report(candidates, tolerance)
+    return {
+        'metric': METRICS[family][0],
+        'higher_is_better': METRICS[family][1],
+        'selected': selected,
+        'candidates': candidates
+    }
+
+def print_report(family, report):
+    print(f"\n{family} ({report['metric']})")
+    print(f"{'params':<45} {'cv':>9} {'holdout':>9} {'1 row ms':>9} {'batch ms':>9} {'size MB':>9}  pareto")
+    for candidate in sorted(report['candidates'], key=lambda candidate: candidate['loss']):
+        marker = 'selected' if candidate is report['selected'] else ('yes' if candidate['pareto'] else '')
+        print(f"{json.dumps(candidate['params']):<45} {candidate['cv_score']:>9.4f} {candidate['holdout_score']:>9.4f} "
+              f"{candidate['single_row_ms']:>9.3f} {candidate['batch_ms']:>9.2f} {candidate['artifact_bytes'] / 2**20:>9.2f}  {marker}")
+
+def parse_values(text):
+    values = []
+    for value in text.split(','):
+        if value.lower() == 'none':
+            values.append(None)
+        elif value.isdigit():
+            values.append(int(value))
+        else:
+            values.append(value)
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validate a grid of settings for each model family and save the selected settings for the training functions")
+    parser.add_argument('--families', default=','.join(FAMILIES), help="Comma-separated model families to tune")
+    parser.add_argument('--folds', type=int, default=3, help="Number of cross-validation folds")
+    parser.add_argument('--jobs', type=int, default=-1, help="Number of candidates evaluated in parallel, -1 uses every core")
+    parser.add_argument('--tolerance', type=float, default=0.01, help="Relative loss above the best candidate accepted in exchange for a smaller, faster model")
+    parser.add_argument('--n-estimators', help="Comma-separated tree counts replacing the default grid")
+    parser.add_argument('--max-depth', help="Comma-separated tree depths (or none) replacing the default grid of the random forests")
+    parser.add_argument('--max-samples', help="Comma-separated sample sizes (or auto) replacing the default grid of the isolation forests")
+    parser.add_argument('--output', default=TUNED_CONFIG_PATH, help="File to save the report and the selected settings to")
+    args = parser.parse_args()
+
+    try:
+        with open(args.output) as f:
+            config = json.load(f)
+    except (FileNotFoundError, ValueError):
+        config = {}
+
+    for family in args.families.split(','):
+        grid = dict(DEFAULT_GRIDS[family])
+        for name, values in [('n_estimators', args.n_estimators), ('max_depth', args.max_depth), ('max_samples', args.max_samples)]:
+            if values and name in grid:
+                grid[name] = parse_values(values)
+
+        config[family] = tune_family(family, grid, args.folds, args.jobs, args.tolerance)
+        print_report(family, config[family])
+
+        with open(args.output, 'w') as f:
+            json.dump(config, f, indent=2)
+
+    print(f"\nSaved the report to {args.output}, the selected settings are used the next time the models are trained")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from metrics import metrics
+from dataset import read_dataset
+import pandas as pd
+import numpy as np
+import threading
+import os
+
+# In-memory weather data store, partitioned per city with a sorted date index
+class WeatherStore:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.mtime = None
+        self.columns = []
+        self.partitions = {}
+        self.lock = threading.Lock()
+
+    # Read the dataset once and split it into a date-sorted frame for each city
+    def load(self):
+        print("Loading weather dataset")
+        df = read_dataset(self.file_path)
+        metrics.inc('weather_csv_loads_total', file=os.path.basename(self.file_path))
+        partitions = {}
+        for city_code, city_df in df.groupby('CityCode', sort=False):
+            city_df = city_df.sort_values('Date', kind='stable').reset_index(drop=True)
+            partitions[city_code] = (city_df['Date'].to_numpy(), city_df)
+
+        self.columns = list(df.columns)
+        self.partitions = partitions
+
+    # Reload the data only when the CSV file has been modified since the last read
+    def refresh(self):
+        mtime = os.path.getmtime(self.file_path)
+        if mtime != self.mtime:
+            with self.lock:
+                if mtime != self.mtime:
+                    self.load()
+                    self.mtime = mtime
+
+    # Check whether the dataset has any observation of a city
+    def has_city(self, city_code):
+        return city_code in self.partitions
+
+    # Get all rows of a city between two dates (inclusive) using a binary search on the date index
+    # The data is as of the last refresh, which get_store does once for every request
+    def get_window(self, city_code, start_date, end_date):
+        partition = self.partitions.get(city_code)
+        if partition is None:
+            return pd.DataFrame(columns=self.columns)
+
+        dates, city_df = partition
+        start = np.searchsorted(dates, np.datetime64(start_date).astype(dates.dtype), side='left')
+        end = np.searchsorted(dates, np.datetime64(end_date).astype(dates.dtype), side='right')
+        return city_df.iloc[start:end]
+
+# One shared store for each dataset file
+stores = {}
+stores_lock = threading.Lock()
+
+# Get the store of a dataset file, creating and loading it on first use
+def get_store(file_path):
+    with stores_lock:
+        if file_path not in stores:
+            stores[file_path] = WeatherStore(file_path)
+        store = stores[file_path]
+    store.refresh()
+    return store